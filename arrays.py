@@ -0,0 +1,155 @@
+import math
+import operator
+from array import array
+from itertools import repeat
+from natives import NativeError
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class ArrayError(NativeError):
+    pass
+
+
+# Numeric array value. The elements live in one contiguous float64 buffer,
+# a numpy array when numpy is installed and an array('d') otherwise, and
+# the builtins below (registered in natives.py) work on the whole buffer
+# at once.
+class LoxArray:
+    __slots__ = ('data',)
+
+    def __init__(self, data):
+        self.data = data
+
+    def __len__(self):
+        return len(self.data)
+
+    def __repr__(self):
+        return f"[{', '.join(map(str, self.data.tolist()))}]"
+
+
+OPERATORS = {
+    '+': operator.add,
+    '-': operator.sub,
+    '*': operator.mul,
+    '/': operator.truediv,
+}
+
+
+def zeros(n: int):
+    if numpy is not None:
+        return numpy.zeros(n)
+    return array('d', bytes(8 * n))
+
+
+def check_array(x) -> LoxArray:
+    if type(x) is not LoxArray:
+        raise ArrayError("Expected an array")
+    return x
+
+
+def check_number(x) -> float:
+    if type(x) is not float:
+        raise ArrayError("Expected a number")
+    return x
+
+
+def check_int(x) -> int:
+    if type(x) is not float or not x.is_integer():
+        raise ArrayError("Expected a whole number")
+    return int(x)
+
+
+def check_index(arr: LoxArray, x) -> int:
+    i = check_int(x)
+    if not 0 <= i < len(arr.data):
+        raise ArrayError("Array index out of range")
+    return i
+
+
+def new_array(n):
+    n = check_int(n)
+    if n < 0:
+        raise ArrayError("Array size can't be negative")
+    return LoxArray(zeros(n))
+
+
+def arange(start, end):
+    start, end = check_int(start), check_int(end)
+    if numpy is not None:
+        return LoxArray(numpy.arange(start, end, dtype=float))
+    return LoxArray(array('d', map(float, range(start, end))))
+
+
+def get(arr, i):
+    arr = check_array(arr)
+    return float(arr.data[check_index(arr, i)])
+
+
+def set_(arr, i, value):
+    arr = check_array(arr)
+    arr.data[check_index(arr, i)] = check_number(value)
+    return value
+
+
+def fill(arr, value):
+    data = check_array(arr).data
+    value = check_number(value)
+    if numpy is not None:
+        data.fill(value)
+    else:
+        data[:] = array('d', repeat(value, len(data)))
+    return arr
+
+
+def sum_(arr):
+    data = check_array(arr).data
+    if numpy is not None:
+        return float(data.sum())
+    return math.fsum(data)
+
+
+def dot(a, b):
+    a, b = check_array(a).data, check_array(b).data
+    if len(a) != len(b):
+        raise ArrayError("Arrays must have the same length")
+    if numpy is not None:
+        return float(numpy.dot(a, b))
+    return math.fsum(map(operator.mul, a, b))
+
+
+# Clamped like a Python slice; negative bounds count from the end
+def slice_(arr, start, end):
+    data = check_array(arr).data
+    part = data[check_int(start):check_int(end)]
+    return LoxArray(part.copy() if numpy is not None else part)
+
+
+# map(arr, op, x) applies a binary operator to every element, with x
+# either a number or an array of the same length
+def map_(arr, op, other):
+    data = check_array(arr).data
+    fn = OPERATORS.get(op)
+    if fn is None:
+        raise ArrayError(f"Unknown array operator {op}")
+
+    if type(other) is LoxArray:
+        other = other.data
+        if len(other) != len(data):
+            raise ArrayError("Arrays must have the same length")
+        if op == '/' and 0.0 in other:
+            raise ArrayError("Cannot divide by zero")
+        if numpy is not None:
+            return LoxArray(fn(data, other))
+        return LoxArray(array('d', map(fn, data, other)))
+
+    other = check_number(other)
+    if op == '/' and other == 0.0:
+        raise ArrayError("Cannot divide by zero")
+    if numpy is not None:
+        return LoxArray(fn(data, other))
+    return LoxArray(array('d', map(fn, data, repeat(other))))
+
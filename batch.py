@@ -0,0 +1,84 @@
+import contextlib
+import io
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+
+
+# Runs each script in a fresh Lox instance (and so a fresh global
+# environment) inside a pool of long-lived worker processes, which import
+# the interpreter once instead of once per script.
+
+def find_scripts(directory: str):
+    paths = []
+    for root, dirs, files in os.walk(directory):
+        dirs[:] = sorted(d for d in dirs if d != '__loxcache__')
+        for name in sorted(files):
+            if name.endswith('.lox'):
+                paths.append(os.path.join(root, name))
+    return paths
+
+
+def run_script(path: str, options: dict) -> dict:
+    # Imported here so the parent process doesn't need the interpreter
+    from main import Lox
+    return run_captured(lambda: Lox(False, **options), path=path)
+
+
+# Runs a script file or source text on the Lox instance make() returns,
+# capturing its output
+def run_captured(make, path=None, source=None) -> dict:
+    out = io.StringIO()
+    error = None
+    start = time.perf_counter()
+    try:
+        with contextlib.redirect_stdout(out):
+            lox = make()
+            if path is not None:
+                lox.run_file(path)
+            else:
+                lox.run_source(source)
+        error = lox.interpreter.runtime_error
+        if error is None and lox.had_error:
+            error = "Syntax error"
+        status = 'ok' if error is None else 'error'
+    except OSError as e:
+        status = 'error'
+        error = f"{e.filename}: {e.strerror}"
+        print(error, file=out)
+    except Exception:
+        status = 'crash'
+        error = traceback.format_exc()
+    return {
+        'script': path,
+        'status': status,
+        'seconds': time.perf_counter() - start,
+        'stdout': out.getvalue(),
+        'error': error,
+    }
+
+
+def run_batch(paths, jobs: int, options: dict) -> dict:
+    start = time.perf_counter()
+    # Several scripts per task keeps the IPC cost down for small scripts
+    chunksize = max(1, len(paths) // (jobs * 4))
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        results = list(pool.map(run_script, paths, [options] * len(paths),
+                                chunksize=chunksize))
+    return {
+        'jobs': jobs,
+        'wall_seconds': time.perf_counter() - start,
+        'scripts': len(results),
+        'failed': sum(1 for r in results if r['status'] != 'ok'),
+        'results': results,
+    }
+
+
+def print_summary(report: dict):
+    for r in report['results']:
+        print(f"{r['status']:<6} {r['seconds']:>8.3f}s  {r['script']}")
+        if r['error'] is not None:
+            print(f"       {r['error'].strip()}")
+    print(f"{report['scripts']} scripts, {report['failed']} failed, "
+          f"{report['wall_seconds']:.2f}s with {report['jobs']} jobs")
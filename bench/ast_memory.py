@@ -0,0 +1,57 @@
+import argparse
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import scanner
+import loxparser
+from expr import Expr, Stmt
+from generate import generate
+
+
+def object_size(obj):
+    size = sys.getsizeof(obj)
+    if hasattr(obj, '__dict__'):
+        size += sys.getsizeof(obj.__dict__)
+    return size
+
+
+def measure(stmts):
+    nodes = node_bytes = tokens = token_bytes = 0
+    seen = set()
+    todo = list(stmts)
+    while todo:
+        node = todo.pop()
+        if isinstance(node, (Expr, Stmt)):
+            nodes += 1
+            node_bytes += object_size(node)
+            todo.extend(getattr(node, f) for f in node._fields)
+        elif isinstance(node, list):
+            node_bytes += sys.getsizeof(node)
+            todo.extend(node)
+        elif isinstance(node, scanner.Token) and id(node) not in seen:
+            seen.add(id(node))
+            tokens += 1
+            token_bytes += object_size(node)
+    return nodes, node_bytes, tokens, token_bytes
+
+
+if __name__ == "__main__":
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument('--statements', type=int, default=50000)
+    args = argparser.parse_args()
+
+    source = generate(args.statements)
+    tracemalloc.start()
+    stmts = loxparser.Parser(scanner.RegexScanner(source).iter_tokens()).parse()
+    traced = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    nodes, node_bytes, tokens, token_bytes = measure(stmts)
+    print(f"source:  {len(source)} chars, {args.statements} statements")
+    print(f"nodes:   {nodes}, {node_bytes / nodes:.1f} bytes/node")
+    print(f"tokens:  {tokens} held by AST, {token_bytes / tokens:.1f} bytes/token")
+    print(f"total:   {(node_bytes + token_bytes) / nodes:.1f} bytes/node incl. tokens")
+    print(f"traced:  {traced / nodes:.1f} bytes/node allocated by parsing")
@@ -0,0 +1,57 @@
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from generate import generate
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs the script in a fresh interpreter, with main.CACHE_THRESHOLD set so
+# that the disk cache is either always or never used
+RUNNER = """
+import sys
+sys.path.insert(0, {root!r})
+import main
+main.CACHE_THRESHOLD = {threshold}
+main.Lox(False, engine={engine!r}, use_cache=True).run_file({path!r})
+"""
+
+
+# Best wall time of the whole process over `repeat` runs
+def run(path, threshold, engine, repeat):
+    code = RUNNER.format(root=ROOT, threshold=threshold, engine=engine, path=path)
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', code], stdout=subprocess.DEVNULL,
+                       check=True)
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    return best
+
+
+if __name__ == "__main__":
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument('--statements', type=int, nargs='+',
+                           default=[10, 100, 300, 1000, 3000, 30000])
+    argparser.add_argument('--engine', choices=['tree', 'vm'], default='vm')
+    argparser.add_argument('--repeat', type=int, default=10)
+    args = argparser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for statements in args.statements:
+            path = os.path.join(tmp, f'script{statements}.lox')
+            with open(path, 'w') as f:
+                f.write(generate(statements))
+            # Once to fill the cache; the timed runs all hit it
+            run(path, 0, args.engine, 1)
+            cached = run(path, 0, args.engine, args.repeat)
+            parsed = run(path, sys.maxsize, args.engine, args.repeat)
+            print(f"{statements:>6} statements {os.path.getsize(path) / 1024:8.1f} KB  "
+                  f"cached {cached * 1000:7.1f} ms  parsed {parsed * 1000:7.1f} ms  "
+                  f"speedup {parsed / cached:5.2f}x")
@@ -0,0 +1,99 @@
+import argparse
+import contextlib
+import io
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import scanner
+import loxparser
+from incremental import Document
+from generate import generate
+
+# Small edits of the kind an editor sends on each keystroke
+EDITS = ['1', ' ', '\n', 'x', ';', '}', '{', '"', '/*', '*/', '// ', 'else ']
+
+
+def full_parse(source):
+    with contextlib.redirect_stdout(io.StringIO()):
+        tokens = scanner.RegexScanner(source).scan_tokens()
+        stmts = loxparser.Parser(tokens).parse()
+    return tokens, stmts
+
+
+def token_key(tokens):
+    return [(t.ttype, t.lexeme, t.line) for t in tokens]
+
+
+# Inserts random text at a random offset, then deletes it again half the
+# time, so the source wanders but stays about the same size
+def random_edits(source, count, seed):
+    rnd = random.Random(seed)
+    pending = None
+    for _ in range(count):
+        if pending is not None and rnd.random() < 0.5:
+            start, text = pending
+            pending = None
+            yield start, start + len(text), ''
+        else:
+            start = rnd.randrange(len(source) + 1)
+            text = rnd.choice(EDITS)
+            pending = start, text
+            yield start, start, text
+
+
+if __name__ == "__main__":
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument('--statements', type=int, default=5000)
+    argparser.add_argument('--edits', type=int, default=200)
+    argparser.add_argument('--seed', type=int, default=0)
+    argparser.add_argument('--check', action='store_true',
+                           help='compare every edit against a full re-parse')
+    args = argparser.parse_args()
+
+    source = generate(args.statements)
+    edits = []
+    text = source
+    for start, end, insert in random_edits(source, args.edits, args.seed):
+        edits.append((start, end, insert))
+        text = text[:start] + insert + text[end:]
+
+    start = time.perf_counter()
+    doc = Document(source)
+    initial = time.perf_counter() - start
+    units = len(doc.units)
+
+    incremental, full = [], []
+    reparsed = 0
+    text = source
+    for start, end, insert in edits:
+        t = time.perf_counter()
+        reparsed += len(doc.edit(start, end, insert))
+        incremental.append(time.perf_counter() - t)
+
+        text = text[:start] + insert + text[end:]
+        t = time.perf_counter()
+        tokens, stmts = full_parse(text)
+        full.append(time.perf_counter() - t)
+
+        if args.check:
+            assert doc.source == text
+            assert token_key(doc.tokens()) == token_key(tokens), (start, insert)
+            assert repr(doc.statements()) == repr(stmts), (start, insert)
+
+    n = len(edits)
+    print(f"document:    {len(source):,} chars, {units:,} units, "
+          f"built in {initial * 1000:.1f} ms")
+    # Edits that open a string or comment re-parse to the end of the
+    # document, so the mean and the median differ a lot
+    print(f"incremental: {statistics.mean(incremental) * 1000:8.3f} ms/edit mean, "
+          f"{statistics.median(incremental) * 1000:8.3f} median, "
+          f"{reparsed / n:.1f} units re-parsed")
+    print(f"full:        {statistics.mean(full) * 1000:8.3f} ms/edit mean, "
+          f"{statistics.median(full) * 1000:8.3f} median")
+    if args.check:
+        print(f"checked {n} edits against a full re-parse")
@@ -0,0 +1,20 @@
+import random
+
+
+# A long straight-line program mixing declarations, blocks, loops and
+# branches, for measuring throughput on large sources
+def generate(statements, seed=0):
+    rnd = random.Random(seed)
+    out = ["var total = 0;\n"]
+    for i in range(statements):
+        kind = rnd.randrange(4)
+        if kind == 0:
+            out.append(f"var v{i} = {rnd.randint(0, 99)} * (total + {i}) - 1;\n")
+        elif kind == 1:
+            out.append(f"{{ var a = {i}; var b = a * 2; total = total + a + b; }}\n")
+        elif kind == 2:
+            out.append(f"{{ var n = {rnd.randint(1, 9)}; "
+                       f"while (n > 0) {{ n = n - 1; total = total - n; }} }}\n")
+        else:
+            out.append(f"if (total == {i}) print \"hit {i}\"; else total = total + 1;\n")
+    return "".join(out)
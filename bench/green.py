@@ -0,0 +1,107 @@
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import Lox
+from scheduler import Scheduler
+
+# A small tenant script: a loop, a recursive function and some output
+PROGRAM = """
+var total = 0;
+for (var i = 0; i < {iterations}; i = i + 1) total = total + i;
+fun fib(n) {{ if (n < 2) return n; return fib(n - 1) + fib(n - 2); }}
+print total + fib(10);
+"""
+
+
+# Every program run to the end, one after another
+def sequential(sources):
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        for source in sources:
+            Lox(False, engine='vm').run_source(source)
+    return out.getvalue().count('\n')
+
+
+def interleaved(sources, quantum):
+    scheduler = Scheduler(quantum=quantum)
+    for i, source in enumerate(sources):
+        scheduler.spawn(source, i)
+    return sum(r['stdout'].count('\n') for r in scheduler.run())
+
+
+# Bytes held per program once all of them are spawned and have run one slice
+def memory_per_program(sources, quantum):
+    tracemalloc.start()
+    scheduler = Scheduler(quantum=quantum)
+    for i, source in enumerate(sources):
+        scheduler.spawn(source, i)
+    for _ in sources:
+        scheduler.step()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return size / len(sources)
+
+
+# The longest the event loop goes without running a 1 ms ticker while the
+# programs run under Scheduler.serve()
+async def loop_latency(sources, quantum, interval):
+    scheduler = Scheduler(quantum=quantum)
+    server = asyncio.create_task(scheduler.serve(interval))
+    worst = 0.0
+    done = False
+
+    async def ticker():
+        nonlocal worst
+        last = time.perf_counter()
+        while not done:
+            await asyncio.sleep(0.001)
+            now = time.perf_counter()
+            worst = max(worst, now - last - 0.001)
+            last = now
+
+    ticks = asyncio.create_task(ticker())
+    start = time.perf_counter()
+    await asyncio.gather(*[scheduler.submit(s, i) for i, s in enumerate(sources)])
+    elapsed = time.perf_counter() - start
+    done = True
+    await ticks
+    server.cancel()
+    return elapsed, worst
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument('--programs', type=int, default=2000)
+    argparser.add_argument('--iterations', type=int, default=2000)
+    argparser.add_argument('--quantum', type=int, default=1000)
+    argparser.add_argument('--interval', type=float, default=0.005,
+                           help='seconds Scheduler.serve() runs programs at a time')
+    args = argparser.parse_args()
+
+    sources = [PROGRAM.format(iterations=args.iterations)] * args.programs
+    lines, seq_time = timed(sequential, sources)
+    green_lines, green_time = timed(interleaved, sources, args.quantum)
+    assert green_lines == lines == args.programs
+    per_program = memory_per_program(sources, args.quantum)
+    elapsed, worst = asyncio.run(loop_latency(sources, args.quantum, args.interval))
+
+    print(f"{args.programs} programs, quantum {args.quantum}")
+    print(f"sequential     {seq_time:7.2f} s")
+    print(f"interleaved    {green_time:7.2f} s  "
+          f"{per_program / 1024:6.1f} KB per suspended program")
+    print(f"under asyncio  {elapsed:7.2f} s  "
+          f"event loop blocked for at most {worst * 1000:.1f} ms")
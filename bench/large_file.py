@@ -0,0 +1,60 @@
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs the script in a fresh interpreter, with main.MMAP_THRESHOLD set so
+# that it is either read into a string or memory-mapped
+RUNNER = """
+import sys
+sys.path.insert(0, {root!r})
+import main
+main.MMAP_THRESHOLD = {threshold}
+main.Lox(False, engine={engine!r}).run_file({path!r})
+"""
+
+
+# A data-embedding script: one string literal per line, folded into a
+# running total so nothing is kept alive
+def write_script(path, megabytes):
+    line = 'total = total + len("' + 'abcdefghij' * 6 + '");\n'
+    with open(path, 'w') as f:
+        f.write("var total = 0;\n")
+        for _ in range(megabytes * 1024 * 1024 // len(line)):
+            f.write(line)
+        f.write("print total;\n")
+
+
+# Peak RSS of the child in MB, and its wall time
+def run(path, threshold, engine):
+    code = RUNNER.format(root=ROOT, threshold=threshold, engine=engine, path=path)
+    start = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, '-c', code], stdout=subprocess.DEVNULL)
+    _, status, usage = os.wait4(proc.pid, 0)
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    if proc.returncode != 0:
+        raise SystemExit(f"run failed with exit code {proc.returncode}")
+    return usage.ru_maxrss / 1024, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument('--sizes', type=int, nargs='+', default=[16, 64, 128],
+                           help='script sizes in MB')
+    argparser.add_argument('--engine', choices=['tree', 'vm'], default='tree')
+    args = argparser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for megabytes in args.sizes:
+            path = os.path.join(tmp, f'data{megabytes}.lox')
+            write_script(path, megabytes)
+            read_rss, read_time = run(path, sys.maxsize, args.engine)
+            mapped_rss, mapped_time = run(path, 0, args.engine)
+            print(f"{megabytes:>5} MB script  "
+                  f"read {read_rss:7.1f} MB peak RSS {read_time:6.1f} s  "
+                  f"mapped {mapped_rss:7.1f} MB peak RSS {mapped_time:6.1f} s")
+            os.unlink(path)
@@ -0,0 +1,55 @@
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import parallel
+from main import Lox
+
+# Embarrassingly parallel: whether each number is prime, by trial division
+PROGRAM = """
+fun isPrime(n) {{
+  if (n < 2) return 0;
+  for (var d = 2; d * d <= n; d = d + 1) {{
+    if (n - floor(n / d) * d == 0) return 0;
+  }}
+  return 1;
+}}
+print parallel(isPrime, 0, {n}, "sum");
+"""
+
+
+def run(source, engine):
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        Lox(False, engine=engine).run_source(source)
+    return out.getvalue()
+
+
+if __name__ == "__main__":
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument('--n', type=int, default=200000)
+    argparser.add_argument('--jobs', type=int, nargs='+',
+                           default=sorted({1, 2, 4, os.cpu_count()}))
+    argparser.add_argument('--engine', choices=['tree', 'vm'], default='vm')
+    args = argparser.parse_args()
+
+    source = PROGRAM.format(n=args.n)
+    base = None
+    for jobs in args.jobs:
+        parallel.JOBS = jobs
+        parallel._pool = None
+        start = time.perf_counter()
+        output = run(source, args.engine)
+        seconds = time.perf_counter() - start
+        if parallel._pool is not None:
+            parallel._pool.shutdown()
+        if base is None:
+            base = (output, seconds)
+        assert output == base[0], (output, base[0])
+        print(f"{jobs:>3} jobs  {seconds:7.2f} s  speedup {base[1] / seconds:5.2f}x  "
+              f"primes below {args.n}: {output.strip()}")
@@ -0,0 +1,170 @@
+import argparse
+import contextlib
+import io
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import scanner
+import loxparser
+from loxparser import LoxParserException
+from expr import *
+from scanner import TokenType
+from run import workloads
+
+
+# The recursive-descent expression parser loxparser.Parser used before it
+# switched to precedence climbing: one method per precedence level, kept
+# here to compare speed and output against.
+class DescentParser(loxparser.Parser):
+    def expression(self) -> Expr:
+        return self.assignment()
+
+    def assignment(self) -> Expr:
+        expr = self.or_stmt()
+        if self.match(TokenType.EQUAL):
+            val = self.assignment()
+            if isinstance(expr, Variable):
+                name = expr.name
+                return Assign(name, val)
+            raise LoxParserException("Invalid assignment target")
+        return expr
+
+    def or_stmt(self) -> Expr:
+        expr = self.and_stmt()
+        while self.match(TokenType.OR):
+            op = self.previous()
+            right = self.and_stmt()
+            expr = Logical(expr, op, right)
+        return expr
+
+    def and_stmt(self) -> Expr:
+        expr = self.equality()
+        while self.match(TokenType.AND):
+            op = self.previous()
+            right = self.equality()
+            expr = Logical(expr, op, right)
+        return expr
+
+    def equality(self) -> Expr:
+        expr = self.comparison()
+
+        while self.match(TokenType.BANG_EQUAL, TokenType.EQUAL_EQUAL):
+            operator = self.previous()
+            right = self.comparison()
+            expr = Binary(expr, operator, right)
+
+        return expr
+
+    def comparison(self) -> Expr:
+        expr = self.addition()
+
+        while self.match(
+                TokenType.GREATER,
+                TokenType.GREATER_EQUAL,
+                TokenType.LESS,
+                TokenType.LESS_EQUAL):
+            operator = self.previous()
+            right = self.addition()
+            expr = Binary(expr, operator, right)
+
+        return expr
+
+    def addition(self) -> Expr:
+        expr = self.multiplication()
+
+        while self.match(TokenType.PLUS, TokenType.MINUS):
+            operator = self.previous()
+            right = self.multiplication()
+            expr = Binary(expr, operator, right)
+
+        return expr
+
+    def multiplication(self) -> Expr:
+        expr = self.unary()
+
+        while self.match(TokenType.STAR, TokenType.SLASH):
+            operator = self.previous()
+            right = self.unary()
+            expr = Binary(expr, operator, right)
+
+        return expr
+
+    def unary(self) -> Expr:
+        if self.match(TokenType.BANG, TokenType.MINUS):
+            operator = self.previous()
+            right = self.unary()
+            return Unary(operator, right)
+        return self.call()
+
+    def call(self) -> Expr:
+        expr = self.primary()
+        while True:
+            if self.match(TokenType.LEFT_PAREN):
+                expr = self.finishcall(expr)
+            else:
+                break
+        return expr
+
+    def primary(self) -> Expr:
+        if self.match(TokenType.FALSE):
+            return Literal(False)
+        if self.match(TokenType.TRUE):
+            return Literal(True)
+        if self.match(TokenType.NIL):
+            return Literal(None)
+
+        if self.match(TokenType.NUMBER, TokenType.STRING):
+            return Literal(self.previous().literal)
+
+        if self.match(TokenType.IDENTIFIER):
+            return Variable(self.previous())
+
+        if self.match(TokenType.LEFT_PAREN):
+            expr = self.expression()
+            self.consume(TokenType.RIGHT_PAREN, "Expect ')'")
+            return Grouping(expr)
+
+        raise LoxParserException("Expect expr")
+
+
+
+def parse(parser_class, tokens):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return parser_class(tokens).parse()
+
+
+def measure(parser_class, tokens, warmup, repeat):
+    times = []
+    for i in range(warmup + repeat):
+        start = time.perf_counter()
+        parse(parser_class, tokens)
+        if i >= warmup:
+            times.append(time.perf_counter() - start)
+    return min(times), statistics.median(times)
+
+
+if __name__ == "__main__":
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument('--warmup', type=int, default=1)
+    argparser.add_argument('--repeat', type=int, default=5)
+    argparser.add_argument('--only', action='append',
+                           help='run only the named workload (repeatable)')
+    args = argparser.parse_args()
+
+    for name, source in workloads().items():
+        if args.only and name not in args.only:
+            continue
+        tokens = scanner.RegexScanner(source).scan_tokens()
+        pratt = parse(loxparser.Parser, tokens)
+        nodes = sum(1 for _ in walk(pratt))
+        if repr(pratt) != repr(parse(DescentParser, tokens)):
+            sys.exit(f"{name}: the parsers disagree")
+
+        old, _ = measure(DescentParser, tokens, args.warmup, args.repeat)
+        new, _ = measure(loxparser.Parser, tokens, args.warmup, args.repeat)
+        print(f"{name:<18} descent {nodes / old:>11,.0f} nodes/s  "
+              f"pratt {nodes / new:>11,.0f} nodes/s  {new / old - 1:+7.1%} time")
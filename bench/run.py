@@ -0,0 +1,188 @@
+import argparse
+import contextlib
+import datetime
+import glob
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import scanner
+import loxparser
+from expr import Stmt, walk
+from resolver import Resolver
+from interpreter import Interpreter
+from compiler import Compiler
+from vm import VM
+from generate import generate
+
+WORKLOAD_DIR = os.path.join(ROOT, 'bench', 'workloads')
+GENERATED_STATEMENTS = 5000
+
+
+def workloads():
+    sources = {}
+    for path in sorted(glob.glob(os.path.join(WORKLOAD_DIR, '*.lox'))):
+        with open(path) as f:
+            sources[os.path.splitext(os.path.basename(path))[0]] = f.read()
+    sources['generated'] = generate(GENERATED_STATEMENTS)
+    return sources
+
+
+class CountingInterpreter(Interpreter):
+    def __init__(self):
+        super().__init__()
+        self.statements = 0
+
+    def eval(self, expr):
+        if isinstance(expr, Stmt):
+            self.statements += 1
+        return super().eval(expr)
+
+
+def scan(source, scanner_class):
+    return scanner_class(source).scan_tokens()
+
+
+def parse(tokens):
+    return loxparser.Parser(tokens).parse()
+
+
+def execute(stmts, engine):
+    if engine == 'vm':
+        VM().interpret([Compiler().compile(stmts)])
+    else:
+        Interpreter().interpret(Resolver().resolve(stmts))
+
+
+# Runs fn(*make_args()) warmup + repeat times; only fn itself is timed
+def measure(fn, make_args, warmup, repeat):
+    times = []
+    for i in range(warmup + repeat):
+        args = make_args()
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            fn(*args)
+            elapsed = time.perf_counter() - start
+        if i >= warmup:
+            times.append(elapsed)
+    return {'best': min(times), 'median': statistics.median(times)}
+
+
+def bench_workload(source, args, scanner_class):
+    tokens = scan(source, scanner_class)
+    stmts = parse(tokens)
+    nodes = sum(1 for _ in walk(stmts))
+
+    counter = CountingInterpreter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        counter.interpret(Resolver().resolve(parse(tokens)))
+
+    timings = {
+        'scanner': (len(tokens), 'tokens', measure(
+            scan, lambda: (source, scanner_class), args.warmup, args.repeat)),
+        'parser': (nodes, 'nodes', measure(
+            parse, lambda: (tokens,), args.warmup, args.repeat)),
+        'interpreter': (counter.statements, 'statements', measure(
+            execute, lambda: (parse(tokens), args.engine),
+            args.warmup, args.repeat)),
+    }
+
+    result = {}
+    for stage, (count, unit, times) in timings.items():
+        result[stage] = {
+            unit: count,
+            'best_seconds': times['best'],
+            'median_seconds': times['median'],
+            f'{unit}_per_sec': count / times['best'],
+        }
+    return result
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+            capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def rate(stage):
+    return next(v for k, v in stage.items() if k.endswith('_per_sec'))
+
+
+def compare(results, baseline, threshold):
+    regressions = 0
+    for name, stages in results.items():
+        for stage, data in stages.items():
+            old = baseline.get(name, {}).get(stage)
+            if old is None:
+                continue
+            change = rate(data) / rate(old) - 1
+            flag = ''
+            if change < -threshold:
+                flag = '  REGRESSION'
+                regressions += 1
+            print(f"{name:<18} {stage:<12} {change:+7.1%}{flag}")
+    return regressions
+
+
+if __name__ == "__main__":
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument('--engine', choices=['tree', 'vm'], default='tree')
+    argparser.add_argument('--scanner', choices=['regex', 'classic'],
+                           default='regex')
+    argparser.add_argument('--warmup', type=int, default=1)
+    argparser.add_argument('--repeat', type=int, default=5)
+    argparser.add_argument('--only', action='append',
+                           help='run only the named workload (repeatable)')
+    argparser.add_argument('--output', help='write results as JSON')
+    argparser.add_argument('--compare', help='JSON file from an earlier run')
+    argparser.add_argument('--threshold', type=float, default=0.10,
+                           help='slowdown reported as a regression (default 0.10)')
+    args = argparser.parse_args()
+
+    scanner_class = scanner.Scanner if args.scanner == 'classic' \
+        else scanner.RegexScanner
+
+    results = {}
+    for name, source in workloads().items():
+        if args.only and name not in args.only:
+            continue
+        results[name] = bench_workload(source, args, scanner_class)
+        s = results[name]
+        print(f"{name:<18} "
+              f"scan {s['scanner']['tokens_per_sec']:>11,.0f} tok/s  "
+              f"parse {s['parser']['nodes_per_sec']:>11,.0f} nodes/s  "
+              f"run {s['interpreter']['statements_per_sec']:>11,.0f} stmts/s")
+
+    report = {
+        'meta': {
+            'commit': git_commit(),
+            'date': datetime.datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'engine': args.engine,
+            'scanner': args.scanner,
+            'warmup': args.warmup,
+            'repeat': args.repeat,
+        },
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+        print()
+        if compare(results, baseline, args.threshold):
+            sys.exit(1)
@@ -0,0 +1,114 @@
+import argparse
+import datetime
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPT = os.path.join(ROOT, 'examples', 'hello.lox')
+
+# Each case is a fresh process; first_output is the time until the first
+# byte appears on its stdout, exit the time until the process is gone.
+# 'python' starts a bare interpreter and prints, which is the floor every
+# other case pays too.
+CASES = {
+    'python': [sys.executable, '-c', 'print("hello")'],
+    'tree': [sys.executable, os.path.join(ROOT, 'main.py'), '--no-cache',
+             SCRIPT],
+    'vm': [sys.executable, os.path.join(ROOT, 'main.py'), '--no-cache',
+           '--engine', 'vm', SCRIPT],
+}
+
+
+def run_once(command):
+    start = time.perf_counter()
+    proc = subprocess.Popen(command, stdout=subprocess.PIPE, cwd=ROOT)
+    proc.stdout.read(1)
+    first_output = time.perf_counter() - start
+    proc.stdout.read()
+    proc.wait()
+    if proc.returncode != 0:
+        raise SystemExit(f"{' '.join(command)} exited with {proc.returncode}")
+    return first_output, time.perf_counter() - start
+
+
+def measure(command, warmup, repeat):
+    firsts, exits = [], []
+    for i in range(warmup + repeat):
+        first_output, exit_ = run_once(command)
+        if i >= warmup:
+            firsts.append(first_output)
+            exits.append(exit_)
+    return {
+        'first_output_best': min(firsts),
+        'first_output_median': statistics.median(firsts),
+        'exit_best': min(exits),
+        'exit_median': statistics.median(exits),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+            capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, threshold):
+    regressions = 0
+    for name, data in results.items():
+        old = baseline.get(name)
+        if old is None:
+            continue
+        change = data['first_output_best'] / old['first_output_best'] - 1
+        flag = ''
+        if change > threshold:
+            flag = '  REGRESSION'
+            regressions += 1
+        print(f"{name:<8} first output {change:+7.1%}{flag}")
+    return regressions
+
+
+if __name__ == "__main__":
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument('--warmup', type=int, default=3)
+    argparser.add_argument('--repeat', type=int, default=20)
+    argparser.add_argument('--output', help='write results as JSON')
+    argparser.add_argument('--compare', help='JSON file from an earlier run')
+    argparser.add_argument('--threshold', type=float, default=0.10,
+                           help='slowdown reported as a regression (default 0.10)')
+    args = argparser.parse_args()
+
+    results = {}
+    for name, command in CASES.items():
+        results[name] = r = measure(command, args.warmup, args.repeat)
+        print(f"{name:<8} first output {r['first_output_best'] * 1000:7.1f} ms "
+              f"(median {r['first_output_median'] * 1000:7.1f})  "
+              f"exit {r['exit_best'] * 1000:7.1f} ms")
+
+    report = {
+        'meta': {
+            'commit': git_commit(),
+            'date': datetime.datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'warmup': args.warmup,
+            'repeat': args.repeat,
+        },
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+        print()
+        if compare(results, baseline, args.threshold):
+            sys.exit(1)
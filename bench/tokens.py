@@ -0,0 +1,53 @@
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import scanner
+import loxparser
+from generate import generate
+
+
+# Bytes and allocations still held by what scan() returns
+def traced(scan):
+    tracemalloc.start()
+    tokens = scan()
+    snapshot = tracemalloc.take_snapshot()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    blocks = sum(stat.count for stat in snapshot.statistics('filename'))
+    return tokens, size, blocks
+
+
+def best_time(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+if __name__ == "__main__":
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument('--statements', type=int, default=20000)
+    argparser.add_argument('--repeat', type=int, default=5)
+    args = argparser.parse_args()
+
+    source = generate(args.statements)
+    scans = {
+        'Token list': lambda: scanner.RegexScanner(source).scan_tokens(),
+        'TokenBuffer': lambda: scanner.RegexScanner(source).scan_buffer(),
+    }
+    print(f"source: {len(source):,} chars")
+    for name, scan in scans.items():
+        tokens, size, blocks = traced(scan)
+        n = len(tokens)
+        scan_time = best_time(scan, args.repeat)
+        parse_time = best_time(lambda: loxparser.Parser(tokens).parse(), args.repeat)
+        print(f"{name:<12} {n:,} tokens  {size / n:6.1f} bytes/token  "
+              f"{blocks / n:5.2f} allocations/token  "
+              f"scan {scan_time * 1000:7.1f} ms  parse {parse_time * 1000:7.1f} ms")
@@ -0,0 +1,374 @@
+import math
+from expr import *
+from scanner import TokenType
+
+
+# Opcodes. Operands, where present, follow the opcode inline in Chunk.code.
+OP_CONSTANT = 0          # const index
+OP_NIL = 1
+OP_TRUE = 2
+OP_FALSE = 3
+OP_POP = 4
+OP_GET_LOCAL = 5         # slot, name const index
+OP_SET_LOCAL = 6         # slot
+OP_DEFINE_LOCAL = 7      # slot
+OP_GET_GLOBAL = 8        # name const index, cache index
+OP_SET_GLOBAL = 9        # name const index, cache index
+OP_DEFINE_GLOBAL = 10    # name const index
+OP_EQUAL = 11
+OP_NOT_EQUAL = 12
+OP_GREATER = 13
+OP_GREATER_EQUAL = 14
+OP_LESS = 15
+OP_LESS_EQUAL = 16
+OP_ADD = 17
+OP_SUBTRACT = 18
+OP_MULTIPLY = 19
+OP_DIVIDE = 20
+OP_NOT = 21
+OP_NEGATE = 22
+OP_PRINT = 23
+OP_JUMP = 24                 # target
+OP_POP_JUMP_IF_FALSE = 25    # target
+OP_JUMP_IF_FALSE_OR_POP = 26  # target
+OP_JUMP_IF_TRUE_OR_POP = 27  # target
+OP_CALL = 28             # argument count
+OP_RETURN = 29
+OP_CLOSURE = 30          # function const index, then (is_local, index) per upvalue
+OP_GET_UPVALUE = 31      # upvalue index, name const index
+OP_SET_UPVALUE = 32      # upvalue index
+OP_CLOSE_UPVALUE = 33    # slot
+OP_TAIL_CALL = 34        # argument count
+
+OP_NAMES = {v: k for k, v in globals().items() if k.startswith('OP_')}
+OPERAND_COUNT = {
+    OP_CONSTANT: 1,
+    OP_GET_LOCAL: 2,
+    OP_SET_LOCAL: 1,
+    OP_DEFINE_LOCAL: 1,
+    OP_GET_GLOBAL: 2,
+    OP_SET_GLOBAL: 2,
+    OP_DEFINE_GLOBAL: 1,
+    OP_JUMP: 1,
+    OP_POP_JUMP_IF_FALSE: 1,
+    OP_JUMP_IF_FALSE_OR_POP: 1,
+    OP_JUMP_IF_TRUE_OR_POP: 1,
+    OP_CALL: 1,
+    OP_GET_UPVALUE: 2,
+    OP_SET_UPVALUE: 1,
+    OP_CLOSE_UPVALUE: 1,
+    OP_TAIL_CALL: 1,
+}
+
+BINARY_OPS = {
+    TokenType.EQUAL_EQUAL: OP_EQUAL,
+    TokenType.BANG_EQUAL: OP_NOT_EQUAL,
+    TokenType.GREATER: OP_GREATER,
+    TokenType.GREATER_EQUAL: OP_GREATER_EQUAL,
+    TokenType.LESS: OP_LESS,
+    TokenType.LESS_EQUAL: OP_LESS_EQUAL,
+    TokenType.PLUS: OP_ADD,
+    TokenType.MINUS: OP_SUBTRACT,
+    TokenType.STAR: OP_MULTIPLY,
+    TokenType.SLASH: OP_DIVIDE,
+}
+
+
+# Constants are shared by value, keyed by type as well since 1.0 == True
+# in Python, and by sign for floats since 0.0 == -0.0
+def constant_key(value):
+    if type(value) is float:
+        return (float, value, math.copysign(1.0, value))
+    return (type(value), value)
+
+
+class Chunk:
+    def __init__(self):
+        self.code = []
+        self.constants = []
+        self.constant_index = {}
+        self.nslots = 0
+        # Inline caches of the global sites, [table version, index] each
+        self.caches = []
+
+    # The constant lookup table is only needed while compiling, and cached
+    # global indices are only meaningful to the table that filled them
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['constant_index']
+        state['caches'] = len(self.caches)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.constant_index = {constant_key(v): i for i, v in enumerate(self.constants)}
+        self.caches = [[0, 0] for _ in range(state['caches'])]
+
+    def emit(self, *ops) -> int:
+        self.code.extend(ops)
+        return len(self.code) - 1
+
+    def add_constant(self, value) -> int:
+        key = constant_key(value)
+        idx = self.constant_index.get(key)
+        if idx is None:
+            idx = len(self.constants)
+            self.constants.append(value)
+            self.constant_index[key] = idx
+        return idx
+
+    def add_cache(self) -> int:
+        self.caches.append([0, 0])
+        return len(self.caches) - 1
+
+    def disassemble(self, name='<script>'):
+        print(f"== {name} ==")
+        functions = []
+        ip = 0
+        while ip < len(self.code):
+            op = self.code[ip]
+            count = OPERAND_COUNT.get(op, 0)
+            if op == OP_CLOSURE:
+                function = self.constants[self.code[ip + 1]]
+                functions.append(function)
+                count = 1 + 2 * function.upvalue_count
+            operands = self.code[ip + 1: ip + 1 + count]
+            text = f"{ip:04} {OP_NAMES[op]:<24} {' '.join(map(str, operands))}"
+            if op in (OP_CONSTANT, OP_GET_GLOBAL, OP_SET_GLOBAL,
+                      OP_DEFINE_GLOBAL, OP_CLOSURE):
+                text += f"  ({self.constants[operands[0]]!r})"
+            print(text)
+            ip += 1 + count
+
+        for function in functions:
+            function.chunk.disassemble(function.name)
+
+
+class Function:
+    def __init__(self, name: str, arity: int):
+        self.name = name
+        self.arity = arity
+        self.chunk = Chunk()
+        self.upvalue_count = 0
+        # Locals after the arguments, appended to the argument slots on call
+        self.padding = []
+
+    def __repr__(self):
+        return f"<fn {self.name}>"
+
+
+# Locals live in per-call slot lists; a local captured by a nested
+# function is reached through an upvalue, which is closed over (copied out
+# of the slot list) when its scope ends or its function returns.
+class Compiler:
+    def __init__(self, enclosing=None, function=None):
+        self.enclosing = enclosing
+        self.function = function
+        if function is None:
+            self.chunk = Chunk()
+            self.scopes = []
+        else:
+            self.chunk = function.chunk
+            self.scopes = [{}]
+        self.nlocals = 0
+        self.captured = set()
+        self.upvalues = []
+
+    def compile(self, stmts: list[Stmt]) -> Chunk:
+        for stmt in stmts:
+            self.visit(stmt)
+        self.chunk.emit(OP_NIL, OP_RETURN)
+        return self.chunk
+
+    def visit(self, node):
+        attr = node.__class__.__name__.lower()
+        return getattr(self, attr)(node)
+
+    def declare(self, name: str) -> int:
+        scope = self.scopes[-1]
+        slot = scope.get(name)
+        if slot is None:
+            slot = self.nlocals
+            scope[name] = slot
+            self.nlocals += 1
+            self.chunk.nslots = max(self.chunk.nslots, self.nlocals)
+        return slot
+
+    def lookup(self, name: str):
+        for scope in reversed(self.scopes):
+            slot = scope.get(name)
+            if slot is not None:
+                return slot
+        return None
+
+    def resolve_upvalue(self, name: str):
+        if self.enclosing is None:
+            return None
+        slot = self.enclosing.lookup(name)
+        if slot is not None:
+            self.enclosing.captured.add(slot)
+            return self.add_upvalue(True, slot)
+        index = self.enclosing.resolve_upvalue(name)
+        if index is not None:
+            return self.add_upvalue(False, index)
+        return None
+
+    def add_upvalue(self, is_local: bool, index: int) -> int:
+        upvalue = (is_local, index)
+        if upvalue not in self.upvalues:
+            self.upvalues.append(upvalue)
+        return self.upvalues.index(upvalue)
+
+    def patch(self, at: int):
+        self.chunk.code[at] = len(self.chunk.code)
+
+    def block(self, stmt: Block):
+        self.scopes.append({})
+        saved = self.nlocals
+        for s in stmt.statements:
+            self.visit(s)
+        for slot in self.scopes.pop().values():
+            if slot in self.captured:
+                self.captured.discard(slot)
+                self.chunk.emit(OP_CLOSE_UPVALUE, slot)
+        self.nlocals = saved
+
+    def define(self, name: str):
+        if self.scopes:
+            self.chunk.emit(OP_DEFINE_LOCAL, self.declare(name))
+        else:
+            self.chunk.emit(OP_DEFINE_GLOBAL, self.chunk.add_constant(name))
+
+    def varstmt(self, stmt: VarStmt):
+        if stmt.initalizer is not None:
+            self.visit(stmt.initalizer)
+        else:
+            self.chunk.emit(OP_NIL)
+        self.define(stmt.name.lexeme)
+
+    def functionstmt(self, stmt: FunctionStmt):
+        name = stmt.name.lexeme
+        # Declared before the body is compiled so it can call itself
+        if self.scopes:
+            self.declare(name)
+
+        function = Function(name, len(stmt.params))
+        compiler = Compiler(self, function)
+        for param in stmt.params:
+            compiler.declare(param.lexeme)
+        for s in stmt.body:
+            compiler.visit(s)
+        compiler.chunk.emit(OP_NIL, OP_RETURN)
+        function.upvalue_count = len(compiler.upvalues)
+        function.padding = [None] * max(0, function.chunk.nslots - function.arity)
+
+        self.chunk.emit(OP_CLOSURE, self.chunk.add_constant(function))
+        for is_local, index in compiler.upvalues:
+            self.chunk.emit(int(is_local), index)
+        self.define(name)
+
+    def returnstmt(self, stmt: ReturnStmt):
+        if isinstance(stmt.value, Call):
+            # The RETURN is only reached when the callee is native
+            self.call(stmt.value, OP_TAIL_CALL)
+        elif stmt.value is not None:
+            self.visit(stmt.value)
+        else:
+            self.chunk.emit(OP_NIL)
+        self.chunk.emit(OP_RETURN)
+
+    def expressionstmt(self, stmt: ExpressionStmt):
+        self.visit(stmt.expression)
+        self.chunk.emit(OP_POP)
+
+    def printstmt(self, stmt: PrintStmt):
+        self.visit(stmt.expression)
+        self.chunk.emit(OP_PRINT)
+
+    def ifstmt(self, stmt: IfStmt):
+        self.visit(stmt.cond)
+        else_jump = self.chunk.emit(OP_POP_JUMP_IF_FALSE, 0)
+        self.visit(stmt.then_branch)
+        if stmt.else_branch is None:
+            self.patch(else_jump)
+            return None
+
+        end_jump = self.chunk.emit(OP_JUMP, 0)
+        self.patch(else_jump)
+        self.visit(stmt.else_branch)
+        self.patch(end_jump)
+
+    def whilestmt(self, stmt: WhileStmt):
+        start = len(self.chunk.code)
+        self.visit(stmt.cond)
+        exit_jump = self.chunk.emit(OP_POP_JUMP_IF_FALSE, 0)
+        self.visit(stmt.body)
+        self.chunk.emit(OP_JUMP, start)
+        self.patch(exit_jump)
+
+    def binary(self, expr: Binary):
+        self.visit(expr.left)
+        self.visit(expr.right)
+        self.chunk.emit(BINARY_OPS[expr.operator.ttype])
+
+    def logical(self, expr: Logical):
+        self.visit(expr.left)
+        if expr.op.ttype == TokenType.OR:
+            jump = self.chunk.emit(OP_JUMP_IF_TRUE_OR_POP, 0)
+        else:
+            jump = self.chunk.emit(OP_JUMP_IF_FALSE_OR_POP, 0)
+        self.visit(expr.right)
+        self.patch(jump)
+
+    def unary(self, expr: Unary):
+        self.visit(expr.right)
+        if expr.operator.ttype == TokenType.BANG:
+            self.chunk.emit(OP_NOT)
+        else:
+            self.chunk.emit(OP_NEGATE)
+
+    def grouping(self, expr: Grouping):
+        self.visit(expr.expression)
+
+    def literal(self, expr: Literal):
+        if expr.value is None:
+            self.chunk.emit(OP_NIL)
+        elif expr.value is True:
+            self.chunk.emit(OP_TRUE)
+        elif expr.value is False:
+            self.chunk.emit(OP_FALSE)
+        else:
+            self.chunk.emit(OP_CONSTANT, self.chunk.add_constant(expr.value))
+
+    def variable(self, expr: Variable):
+        name = expr.name.lexeme
+        slot = self.lookup(name)
+        if slot is not None:
+            self.chunk.emit(OP_GET_LOCAL, slot, self.chunk.add_constant(name))
+            return None
+        index = self.resolve_upvalue(name)
+        if index is not None:
+            self.chunk.emit(OP_GET_UPVALUE, index, self.chunk.add_constant(name))
+        else:
+            self.chunk.emit(OP_GET_GLOBAL, self.chunk.add_constant(name),
+                            self.chunk.add_cache())
+
+    def assign(self, expr: Assign):
+        self.visit(expr.val)
+        name = expr.name.lexeme
+        slot = self.lookup(name)
+        if slot is not None:
+            self.chunk.emit(OP_SET_LOCAL, slot)
+            return None
+        index = self.resolve_upvalue(name)
+        if index is not None:
+            self.chunk.emit(OP_SET_UPVALUE, index)
+        else:
+            self.chunk.emit(OP_SET_GLOBAL, self.chunk.add_constant(name),
+                            self.chunk.add_cache())
+
+    def call(self, expr: Call, op=OP_CALL):
+        self.visit(expr.calle)
+        for arg in expr.arguments:
+            self.visit(arg)
+        self.chunk.emit(op, len(expr.arguments))
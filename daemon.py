@@ -0,0 +1,81 @@
+import json
+import os
+import signal
+import socket
+import socketserver
+import sys
+import batch
+
+# A long-lived process that runs scripts sent over a Unix socket, so each
+# run costs parsing and execution only. The protocol is one JSON object
+# per connection in each direction:
+#   request   {"path": "/abs/script.lox"} or {"source": "print 1;"}
+#   response  the run_captured() result: status, error, seconds, stdout
+# Requests are served one at a time because output is captured through
+# sys.stdout. Each one gets a Lox instance of its own, built while the
+# daemon was idle, so no globals are shared between requests.
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        line = self.rfile.readline()
+        # Connections that send nothing are just checking the daemon is up
+        if not line:
+            return None
+        try:
+            request = json.loads(line)
+        except ValueError:
+            request = None
+        if not isinstance(request, dict) or \
+                not isinstance(request.get('path', request.get('source')), str):
+            response = {'status': 'crash', 'error': 'Malformed request',
+                        'seconds': 0.0, 'stdout': '', 'script': None}
+        else:
+            response = self.server.run(request.get('path'), request.get('source'))
+        self.wfile.write(json.dumps(response).encode() + b'\n')
+
+
+class LoxDaemon(socketserver.UnixStreamServer):
+    def __init__(self, path: str, options: dict):
+        self.options = options
+        self.spare = self.new_lox()
+        super().__init__(path, RequestHandler)
+
+    def new_lox(self):
+        from main import Lox
+        return Lox(False, **self.options)
+
+    def run(self, path, source):
+        lox, self.spare = self.spare, None
+        try:
+            return batch.run_captured(lambda: lox, path=path, source=source)
+        finally:
+            self.spare = self.new_lox()
+
+
+# Refuses to replace the socket of a daemon that is still running
+def remove_stale_socket(path: str):
+    if not os.path.exists(path):
+        return None
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(path)
+    except OSError:
+        os.unlink(path)
+        return None
+    finally:
+        probe.close()
+    raise SystemExit(f"{path}: a daemon is already listening")
+
+
+def serve(path: str, options: dict):
+    remove_stale_socket(path)
+    server = LoxDaemon(path, options)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        os.unlink(path)
@@ -1,132 +1,262 @@
-from dataclasses import dataclass
-from typing import List
 from scanner import Token
 
+# Nodes are plain classes with __slots__ rather than dataclasses: generating
+# dataclass methods at import time was a large part of startup. _fields
+# lists the constructor arguments in order; any other slots are runtime
+# caches.
+
+
+# Nodes pickle as a constructor call with their fields, which is both
+# smaller and faster to load than the default slots state. Caches are left
+# out, and nodes the interpreter has quickened pickle as their generic
+# class.
+def _reduce_node(self):
+    cls = self.generic or self.__class__
+    return (cls, tuple(getattr(self, f) for f in cls._fields))
+
+
+# Same format as the dataclass repr the nodes used to have
+def _repr_node(self):
+    fields = ', '.join(f"{f}={getattr(self, f)!r}" for f in self._fields)
+    return f"{self.__class__.__name__}({fields})"
+
 
 class Expr:
-    pass
+    __slots__ = ()
+    __reduce__ = _reduce_node
+    __repr__ = _repr_node
+    generic = None
+    _fields = ()
 
 
-@dataclass
 class Assign(Expr):
-    name: Token
-    val: Expr
+    __slots__ = ('name', 'val', 'depth', 'slot', 'gversion', 'gindex')
+    _fields = ('name', 'val', 'depth', 'slot')
+
+    def __init__(self, name: Token, val: Expr, depth: int | None = None,
+                 slot: int | None = None):
+        self.name = name
+        self.val = val
+        self.depth = depth
+        self.slot = slot
+        # Inline cache for global sites: index into the global table, valid
+        # while the table's version is gversion
+        self.gversion = 0
+        self.gindex = 0
 
     def __repr__(self):
         return f"({self.name} = {self.val})"
 
 
-@dataclass
 class Binary(Expr):
-    left: Expr
-    operator: Token
-    right: Expr
+    __slots__ = ('left', 'operator', 'right', 'warmup')
+    _fields = ('left', 'operator', 'right')
+
+    def __init__(self, left: Expr, operator: Token, right: Expr):
+        self.left = left
+        self.operator = operator
+        self.right = right
+        # Generic evaluations left before the interpreter tries to quicken it
+        self.warmup = 8
 
     def __repr__(self):
         return f"({self.left} {self.operator.lexeme} {self.right})"
 
 
-@dataclass
 class Call(Expr):
-    calle: Expr
-    paren: Token
-    arguments: List[Expr]
+    __slots__ = ('calle', 'paren', 'arguments')
+    _fields = __slots__
+
+    def __init__(self, calle: Expr, paren: Token, arguments: list[Expr]):
+        self.calle = calle
+        self.paren = paren
+        self.arguments = arguments
 
     def __repr__(self):
         return f"{self.paren}({self.arguments})"
 
 
-@dataclass
 class Grouping(Expr):
-    expression: Expr
+    __slots__ = ('expression',)
+    _fields = __slots__
+
+    def __init__(self, expression: Expr):
+        self.expression = expression
 
     def __repr__(self):
         return f"({self.expression})"
 
 
-@dataclass
 class Literal(Expr):
-    value: object
+    __slots__ = ('value',)
+    _fields = __slots__
+
+    def __init__(self, value: object):
+        self.value = value
 
     def __repr__(self):
         return f"{self.value}"
 
 
-@dataclass
 class Logical(Expr):
-    left: Expr
-    op: Token
-    right: Expr
+    __slots__ = ('left', 'op', 'right')
+    _fields = __slots__
+
+    def __init__(self, left: Expr, op: Token, right: Expr):
+        self.left = left
+        self.op = op
+        self.right = right
 
     def __repr__(self):
         return f"({self.left} {self.op.lexeme} {self.right})"
 
 
-@dataclass
 class Unary(Expr):
-    operator: Token
-    right: Expr
+    __slots__ = ('operator', 'right', 'warmup')
+    _fields = ('operator', 'right')
+
+    def __init__(self, operator: Token, right: Expr):
+        self.operator = operator
+        self.right = right
+        # Generic evaluations left before the interpreter tries to quicken it
+        self.warmup = 8
 
     def __repr__(self):
         return f"<{self.operator.lexeme} {self.right}>"
 
 
-@dataclass
 class Variable(Expr):
-    name: Token
+    __slots__ = ('name', 'depth', 'slot', 'gversion', 'gindex')
+    _fields = ('name', 'depth', 'slot')
+
+    def __init__(self, name: Token, depth: int | None = None,
+                 slot: int | None = None):
+        self.name = name
+        self.depth = depth
+        self.slot = slot
+        # Inline cache for global sites, as in Assign
+        self.gversion = 0
+        self.gindex = 0
 
     def __repr__(self):
         return f"<{self.name.lexeme}>"
 
 
 class Stmt:
-    pass
+    __slots__ = ()
+    __reduce__ = _reduce_node
+    __repr__ = _repr_node
+    generic = None
+    _fields = ()
 
 
-@dataclass
 class Block(Stmt):
-    statements: List[Stmt]
+    __slots__ = ('statements', 'size')
+    _fields = __slots__
+
+    def __init__(self, statements: list[Stmt], size: int = 0):
+        self.statements = statements
+        self.size = size
 
     def __repr__(self):
         return f"<<{self.statements}>>"
 
+    def has_declarations(self) -> bool:
+        return any(isinstance(s, (VarStmt, FunctionStmt)) for s in self.statements)
+
 
-@dataclass
 class ExpressionStmt(Stmt):
-    expression: Expr
+    __slots__ = ('expression',)
+    _fields = __slots__
+
+    def __init__(self, expression: Expr):
+        self.expression = expression
 
     def __repr__(self):
         return f"<<{self.expression}>>"
 
 
-@dataclass
 class PrintStmt(Stmt):
-    expression: Expr
+    __slots__ = ('expression',)
+    _fields = __slots__
+
+    def __init__(self, expression: Expr):
+        self.expression = expression
 
     def __repr__(self):
         return f"<<PRINT {self.expression}>>"
 
 
-@dataclass
 class WhileStmt(Stmt):
-    cond: Expr
-    body: Stmt
+    __slots__ = ('cond', 'body')
+    _fields = __slots__
+
+    def __init__(self, cond: Expr, body: Stmt):
+        self.cond = cond
+        self.body = body
 
 
-@dataclass
 class VarStmt(Stmt):
-    name: Token
-    initalizer: Expr
+    __slots__ = ('name', 'initalizer', 'slot')
+    _fields = __slots__
+
+    def __init__(self, name: Token, initalizer: Expr, slot: int | None = None):
+        self.name = name
+        self.initalizer = initalizer
+        self.slot = slot
 
     def __repr__(self):
         return f"<<{str(self.name)} := {self.initalizer}>>"
 
 
-@dataclass
 class IfStmt(Stmt):
-    cond: Expr
-    then_branch: Stmt
-    else_branch: Stmt
+    __slots__ = ('cond', 'then_branch', 'else_branch')
+    _fields = __slots__
+
+    def __init__(self, cond: Expr, then_branch: Stmt, else_branch: Stmt):
+        self.cond = cond
+        self.then_branch = then_branch
+        self.else_branch = else_branch
+
+
+class FunctionStmt(Stmt):
+    __slots__ = ('name', 'params', 'body', 'slot', 'size')
+    _fields = __slots__
+
+    def __init__(self, name: Token, params: list[Token], body: list[Stmt],
+                 slot: int | None = None, size: int = 0):
+        self.name = name
+        self.params = params
+        self.body = body
+        self.slot = slot
+        self.size = size
+
+    def __repr__(self):
+        params = ', '.join(p.lexeme for p in self.params)
+        return f"<<FUN {self.name.lexeme}({params}) {self.body}>>"
+
+
+class ReturnStmt(Stmt):
+    __slots__ = ('keyword', 'value')
+    _fields = __slots__
+
+    def __init__(self, keyword: Token, value: Expr):
+        self.keyword = keyword
+        self.value = value
+
+    def __repr__(self):
+        return f"<<RETURN {self.value}>>"
+
+
+# Yields node and every node below it, depth first
+def walk(node):
+    if isinstance(node, list):
+        for item in node:
+            yield from walk(item)
+    elif isinstance(node, (Expr, Stmt)):
+        yield node
+        for field in node._fields:
+            yield from walk(getattr(node, field))
 
 
 if __name__ == "__main__":
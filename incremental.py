@@ -0,0 +1,282 @@
+import re
+from bisect import bisect_right
+from scanner import RegexScanner, TokenType, BLOCK_COMMENT_RE
+from loxparser import Parser
+
+# Incremental scanning and parsing for editors and the REPL. A Document
+# keeps its source split into units, runs of whole lines holding one or
+# more top-level declarations, each with its own tokens and statements.
+# An edit re-scans and re-parses the units it touches and the one before
+# them, since an `else` or the parser's error recovery can reach back into
+# it. Every other unit keeps its tokens and statements; the ones after the
+# edit only have their line numbers moved.
+
+# Newlines outside strings and comments, and the constructs that can hide
+# one
+LINE_RE = re.compile(r'\n|"[^"]*"?|//[^\n]*|/\*')
+
+
+class Unit:
+    __slots__ = ('start', 'line', 'tokens', 'stmts', 'errors', 'scan_errors')
+
+    def __init__(self, start: int, line: int):
+        self.start = start
+        self.line = line
+        self.tokens = []
+        self.stmts = []
+        # (line, message) for each scan or parse error
+        self.errors = []
+        # (index, line, message) for each scan error, reported just before
+        # tokens[index] was read, so the error comes back in the same place
+        # if the tokens are parsed again without rescanning them
+        self.scan_errors = []
+
+
+# Yields (offset, line) for every line of source from pos on that doesn't
+# start inside a string or block comment. Only those lines can start a
+# unit. pos must itself be outside both.
+class LineScanner:
+    def __init__(self, source: str, pos: int, line: int):
+        self.source = source
+        self.pos = pos
+        self.line = line
+        # Whether the source ends inside a string or block comment
+        self.open = False
+
+    def __iter__(self):
+        source = self.source
+        pos, line = self.pos, self.line
+        while True:
+            for m in LINE_RE.finditer(source, pos):
+                text = m.group()
+                if text == '\n':
+                    line += 1
+                    yield m.end(), line
+                elif text == '/*':
+                    pos, line = self.block_comment(m.end(), line)
+                    break
+                elif text[0] == '"':
+                    line += text.count('\n')
+                    if len(text) == 1 or text[-1] != '"':
+                        self.open = True
+                        return
+            else:
+                return
+
+    def block_comment(self, pos, line):
+        depth = 1
+        for m in BLOCK_COMMENT_RE.finditer(self.source, pos):
+            text = m.group()
+            if text == '\n':
+                line += 1
+            elif text == '/*':
+                depth += 1
+            else:
+                depth -= 1
+                if depth == 0:
+                    return m.end(), line
+        self.open = True
+        return len(self.source), line
+
+
+class UnitScanner(RegexScanner):
+    def __init__(self, source, line, pending):
+        super().__init__(source, line)
+        # (line, message) for the errors reported since the last token
+        self.pending = pending
+
+    # The line is kept apart from the message, which the scanner starts
+    # with it, so that moving the unit only has to change the number
+    def report(self, message, line):
+        self.pending.append((line, message.removeprefix(f"{line}: ")))
+
+
+class UnitParser(Parser):
+    def __init__(self, tokens, errors):
+        self.errors = errors
+        # Whether an error was found at the end of the input, which in the
+        # REPL means the input isn't finished yet
+        self.at_eof = False
+        super().__init__(tokens)
+
+    def report(self, error):
+        self.errors.append((self.peek().line, str(error)))
+        if self.is_at_end():
+            self.at_eof = True
+
+
+class Document:
+    def __init__(self, source: str = ''):
+        self.source = source
+        self.units = []
+        self.eof = None
+        self.open = False
+        self.eof_error = False
+        # (line, message) for the scan errors reported just before eof
+        self.eof_errors = []
+        self.rebuild(0, 0, 1, [])
+
+    def statements(self):
+        return [stmt for unit in self.units for stmt in unit.stmts]
+
+    def tokens(self):
+        return [tok for unit in self.units for tok in unit.tokens] + [self.eof]
+
+    def errors(self):
+        return [error for unit in self.units for error in unit.errors]
+
+    # False while a string, comment or declaration is left open at the end
+    def is_complete(self) -> bool:
+        return not self.open and not self.eof_error
+
+    # Replaces source[start:end] with text. Returns the new units; the
+    # others are the same objects as before.
+    def edit(self, start: int, end: int, text: str):
+        old = self.source
+        self.source = old[:start] + text + old[end:]
+        chars = len(text) - (end - start)
+        lines = text.count('\n') - old.count('\n', start, end)
+
+        starts = [unit.start for unit in self.units]
+        first = max(bisect_right(starts, start) - 2, 0)
+        rest = self.units[bisect_right(starts, end):]
+        for unit in rest:
+            unit.start += chars
+            if lines:
+                unit.line += lines
+                for tok in unit.tokens:
+                    tok.line += lines
+                unit.errors = [(n + lines, message) for n, message in unit.errors]
+                unit.scan_errors = [(k, n + lines, message)
+                                    for k, n, message in unit.scan_errors]
+        if lines:
+            self.eof.line += lines
+            self.eof_errors = [(n + lines, message) for n, message in self.eof_errors]
+
+        unit = self.units[first]
+        return self.rebuild(first, unit.start, unit.line, rest)
+
+    # Re-parses from (start, line), the start of units[index], reusing the
+    # units in rest once the new parse lines up with one of them
+    def rebuild(self, index, start, line, rest):
+        source = self.source
+
+        # The old tokens of a unit are still right if nothing before it
+        # leaves a string or comment open
+        clean = {line: start}
+        end = len(source)
+        lines = LineScanner(source, start, line)
+        k = 0
+        for offset, n in lines:
+            clean[n] = offset
+            while k < len(rest) and rest[k].start < offset:
+                k += 1
+            if k < len(rest) and rest[k].start == offset:
+                end = offset
+                break
+        else:
+            self.open = lines.open
+        rest = rest[k:] if end < len(source) else []
+
+        errors = []
+        # Errors before the first token from the lines above it aren't in
+        # the text scanned again
+        pending = []
+        if index < len(self.units):
+            pending = [(n, message) for k, n, message in self.units[index].scan_errors
+                       if k == 0 and n < line]
+        scanner = UnitScanner(source[start:end], line, pending)
+        consumed = []
+        # Scan errors reported just before each token, by id(token). Old
+        # tokens bring theirs along, so the parser sees the same errors at
+        # the same points as if the whole source had been scanned again.
+        reported = {}
+        # Where the errors of the last token read start in errors
+        mark = [0]
+        # Index of the old unit the stream is in, once past the region
+        feeding = [None]
+
+        def read(tok, scan_errors):
+            mark[0] = len(errors)
+            if scan_errors:
+                errors.extend(scan_errors)
+                reported[id(tok)] = scan_errors
+            consumed.append(tok)
+            return tok
+
+        def stream():
+            for tok in scanner.iter_tokens():
+                if tok.ttype is not TokenType.EOF or not rest:
+                    yield read(tok, pending[:])
+                    del pending[:]
+            for i, unit in enumerate(rest):
+                feeding[0] = i
+                scan_errors = unit.scan_errors
+                j = 0
+                # The ones from lines above the first unit were in the
+                # region; those at its end come before that unit instead
+                if i == 0:
+                    while j < len(scan_errors) and scan_errors[j][0] == 0 \
+                            and scan_errors[j][1] < unit.line:
+                        j += 1
+                for k, tok in enumerate(unit.tokens):
+                    before = pending[:] if i == k == 0 else []
+                    while j < len(scan_errors) and scan_errors[j][0] == k:
+                        before.append(scan_errors[j][1:])
+                        j += 1
+                    yield read(tok, before)
+            if rest:
+                yield read(self.eof, list(self.eof_errors))
+
+        parser = UnitParser(stream(), errors)
+        unit = Unit(start, line)
+        units = [unit]
+        tail = []
+        while not parser.is_at_end():
+            # Between declarations at the start of an old unit: everything
+            # from here on parses as it did before. Only the errors before
+            # its first token, which are all errors holds, can have changed.
+            i = feeding[0]
+            if i is not None and parser.peek() is rest[i].tokens[0]:
+                tail = rest[i:]
+                old = rest[i]
+                before = sum(1 for k, n, message in old.scan_errors if k == 0)
+                old.errors[:before] = errors
+                old.scan_errors[:before] = [(0, n, message) for n, message in errors]
+                break
+
+            stmt = parser.decl()
+            tokens = consumed[:-1]
+            del consumed[:-1]
+            # Scan errors before the next token go with it rather than with
+            # this declaration, so that a unit's errors come from its own
+            # tokens and the lines above them
+            after = len(reported.get(id(consumed[0]), ()))
+            ahead = errors[mark[0]:mark[0] + after]
+            del errors[mark[0]:mark[0] + after]
+
+            tok = tokens[0]
+            first_line = tok.line
+            if tok.ttype is TokenType.STRING:
+                first_line -= tok.lexeme.count('\n')
+            if unit.tokens and first_line > unit.tokens[-1].line and first_line in clean:
+                unit = Unit(clean[first_line], first_line)
+                units.append(unit)
+
+            for k, tok in enumerate(tokens, len(unit.tokens)):
+                for n, message in reported.get(id(tok), ()):
+                    unit.scan_errors.append((k, n, message))
+            unit.tokens.extend(tokens)
+            if stmt is not None:
+                unit.stmts.append(stmt)
+            unit.errors.extend(errors)
+            errors[:] = ahead
+        else:
+            self.eof = parser.peek()
+            self.eof_error = parser.at_eof
+            self.eof_errors = reported.get(id(self.eof), [])
+            # Errors found scanning past the last declaration
+            unit.errors.extend(errors)
+
+        self.units[index:] = units + tail
+        return units
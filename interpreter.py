@@ -1,7 +1,12 @@
-import time
+import itertools
+import sys
+from collections.abc import Iterable
 from expr import *
 from scanner import TokenType
 from abc import ABC
+import natives
+from natives import NativeFunction, NativeError
+from rope import Rope, concat
 
 
 class LoxRuntimeError(Exception):
@@ -12,61 +17,204 @@ class LoxCallabe(ABC):
     def arity(self) -> int:
         pass
 
-    def call(self, interpreter, arguments: List):
+    def call(self, *arguments):
         pass
 
 
+# Bodies are executed by Interpreter.call_function directly, which binds the
+# arguments straight into the new frame
+class LoxFunction(LoxCallabe):
+    def __init__(self, declaration: FunctionStmt, closure):
+        self.declaration = declaration
+        self.closure = closure
+
+    def arity(self):
+        return len(self.declaration.params)
+
+    def __repr__(self):
+        return f"<fn {self.declaration.name.lexeme}>"
+
+
+# From 3.11 on, calls between Python functions don't use the C stack, so
+# the recursion limit only bounds memory (roughly 300 bytes per frame) and
+# can be raised for deep non-tail recursion in Lox programs
+DEEP_RECURSION = sys.version_info >= (3, 11)
+RECURSION_LIMIT = 1_000_000
+
+
+# Statements return None, except `return` which stores its value on the
+# interpreter and returns this marker so enclosing statements stop early
+# without unwinding through an exception
+RETURN = object()
+
+
 class Environment:
-    def __init__(self, env):
+    def __init__(self, env, values):
         self.previous = env
-        self.values = {}
+        self.values = values
+
+    def ancestor(self, depth):
+        env = self
+        for _ in range(depth):
+            env = env.previous
+        return env
+
+
+# Globals live in a list indexed through `names`. Entries are never removed
+# or reordered, so the index a Variable or Assign site caches stays valid
+# for as long as it runs against the same table. Versions are unique per
+# table, which makes sites re-resolve when the same AST or chunk is run by
+# another interpreter.
+_table_versions = itertools.count(1)
+
+
+class GlobalEnvironment:
+    def __init__(self):
+        self.names = {}
+        self.values = []
+        self.version = next(_table_versions)
 
     def define(self, name, val):
-        self.values[name] = val
+        index = self.names.get(name)
+        if index is None:
+            self.names[name] = len(self.values)
+            self.values.append(val)
+        else:
+            self.values[index] = val
 
-    def assign(self, name, val):
-        if self.values.get(name) is not None:
-            self.values[name] = val
-            return None
-        if self.previous is not None:
-            self.previous.assign(name, val)
-            return None
-        raise LoxRuntimeError(
-            f'undefined variable {name}, cannot assign {val}')
+    # Fills a site's inline cache; None if the name was never defined
+    def resolve(self, site):
+        index = self.names.get(site.name.lexeme)
+        if index is not None:
+            site.gversion = self.version
+            site.gindex = index
+        return index
 
-    def get(self, name):
-        val = self.values.get(name)
-        if val is not None:
-            return val
 
-        if self.previous is not None:
-            val = self.previous.get(name)
-            if val is not None:
-                return val
+# Quickened forms of Binary and Unary. Once a generic node has warmed up
+# it is rewritten in place (its class swapped) into the form specialized
+# for the operand types it just saw, so later evaluations dispatch straight
+# to a handler that does one type check and the operation. A handler that
+# sees other types swaps the node back, and the node waits QUICKEN_BACKOFF
+# generic evaluations before it is tried again.
+QUICKEN_BACKOFF = 64
 
-        raise LoxRuntimeError(f"Varname {name} is never assigned")
 
+class FloatAdd(Binary):
+    __slots__ = ()
+    generic = Binary
 
-class Interpreter:
-    def __init__(self):
-        self.globalenv = Environment(None)
-        self.env = self.globalenv
 
-        class Clock(LoxCallabe):
-            def arity(self):
-                return 0
+class FloatSubtract(Binary):
+    __slots__ = ()
+    generic = Binary
+
+
+class FloatMultiply(Binary):
+    __slots__ = ()
+    generic = Binary
+
+
+class FloatDivide(Binary):
+    __slots__ = ()
+    generic = Binary
+
+
+class FloatLess(Binary):
+    __slots__ = ()
+    generic = Binary
+
+
+class FloatLessEqual(Binary):
+    __slots__ = ()
+    generic = Binary
+
 
-            def call(self):
-                return time.time()
-        
-        self.globalenv.define("clock", Clock())
+class FloatGreater(Binary):
+    __slots__ = ()
+    generic = Binary
 
-    def interpret(self, stmts: List[Stmt]):
+
+class FloatGreaterEqual(Binary):
+    __slots__ = ()
+    generic = Binary
+
+
+class StringConcat(Binary):
+    __slots__ = ()
+    generic = Binary
+
+
+# Equality is defined for every pair of types, so these never deoptimize
+class Equal(Binary):
+    __slots__ = ()
+    generic = Binary
+
+
+class NotEqual(Binary):
+    __slots__ = ()
+    generic = Binary
+
+
+class FloatNegate(Unary):
+    __slots__ = ()
+    generic = Unary
+
+
+class BoolNot(Unary):
+    __slots__ = ()
+    generic = Unary
+
+
+FLOAT_BINARY = {
+    TokenType.PLUS: FloatAdd,
+    TokenType.MINUS: FloatSubtract,
+    TokenType.STAR: FloatMultiply,
+    TokenType.SLASH: FloatDivide,
+    TokenType.LESS: FloatLess,
+    TokenType.LESS_EQUAL: FloatLessEqual,
+    TokenType.GREATER: FloatGreater,
+    TokenType.GREATER_EQUAL: FloatGreaterEqual,
+    TokenType.EQUAL_EQUAL: Equal,
+    TokenType.BANG_EQUAL: NotEqual,
+}
+STRING_BINARY = {
+    TokenType.PLUS: StringConcat,
+    TokenType.EQUAL_EQUAL: Equal,
+    TokenType.BANG_EQUAL: NotEqual,
+}
+ANY_BINARY = {
+    TokenType.EQUAL_EQUAL: Equal,
+    TokenType.BANG_EQUAL: NotEqual,
+}
+
+
+class Interpreter:
+    def __init__(self):
+        self.globalenv = GlobalEnvironment()
+        self.env = None
+        self.return_value = None
+        self.tail_call = None
+        # Message of the error that stopped the last interpret() call
+        self.runtime_error = None
+        natives.bind(self.globalenv, self)
+
+    def interpret(self, stmts: Iterable[Stmt]):
+        self.runtime_error = None
+        limit = sys.getrecursionlimit()
+        if DEEP_RECURSION:
+            sys.setrecursionlimit(max(limit, RECURSION_LIMIT))
         try:
             for stmt in stmts:
                 self.eval(stmt)
         except LoxRuntimeError as e:
+            self.runtime_error = str(e)
             print(e)
+        except RecursionError:
+            self.runtime_error = "Stack overflow."
+            print(self.runtime_error)
+        finally:
+            sys.setrecursionlimit(limit)
 
     def eval(self, expr):
         attr = expr.__class__.__name__.lower()
@@ -75,8 +223,26 @@ class Interpreter:
     def binary(self, expr: Binary):
         left = self.eval(expr.left)
         right = self.eval(expr.right)
-        op = expr.operator.ttype
+        if expr.warmup:
+            expr.warmup -= 1
+        else:
+            self.quicken_binary(expr, left, right)
+        return self.binary_op(expr.operator.ttype, left, right)
+
+    def quicken_binary(self, expr: Binary, left, right):
+        if type(left) is float and type(right) is float:
+            quickened = FLOAT_BINARY.get(expr.operator.ttype)
+        elif (type(left) is str or type(left) is Rope) and \
+                (type(right) is str or type(right) is Rope):
+            quickened = STRING_BINARY.get(expr.operator.ttype)
+        else:
+            quickened = ANY_BINARY.get(expr.operator.ttype)
+        if quickened is None:
+            expr.warmup = QUICKEN_BACKOFF
+        else:
+            expr.__class__ = quickened
 
+    def binary_op(self, op, left, right):
         if op == TokenType.BANG_EQUAL:
             return not self.is_equal(left, right)
         if op == TokenType.EQUAL_EQUAL:
@@ -97,8 +263,8 @@ class Interpreter:
             self.check_number(left, right)
             return left - right
         if op == TokenType.PLUS:
-            if isinstance(left, str) and isinstance(right, str):
-                return left + right
+            if isinstance(left, (str, Rope)) and isinstance(right, (str, Rope)):
+                return concat(left, right)
             if isinstance(left, float) and isinstance(right, float):
                 return left + right
 
@@ -112,16 +278,100 @@ class Interpreter:
             self.check_number(left, right)
             return left * right
 
-    def group(self, expr: Grouping):
-        return self.eval(expr)
+    def deoptimize_binary(self, expr: Binary, left, right):
+        expr.__class__ = Binary
+        expr.warmup = QUICKEN_BACKOFF
+        return self.binary_op(expr.operator.ttype, left, right)
+
+    def floatadd(self, expr: Binary):
+        left = self.eval(expr.left)
+        right = self.eval(expr.right)
+        if type(left) is float and type(right) is float:
+            return left + right
+        return self.deoptimize_binary(expr, left, right)
+
+    def floatsubtract(self, expr: Binary):
+        left = self.eval(expr.left)
+        right = self.eval(expr.right)
+        if type(left) is float and type(right) is float:
+            return left - right
+        return self.deoptimize_binary(expr, left, right)
+
+    def floatmultiply(self, expr: Binary):
+        left = self.eval(expr.left)
+        right = self.eval(expr.right)
+        if type(left) is float and type(right) is float:
+            return left * right
+        return self.deoptimize_binary(expr, left, right)
+
+    def floatdivide(self, expr: Binary):
+        left = self.eval(expr.left)
+        right = self.eval(expr.right)
+        if type(left) is float and type(right) is float and right != 0.0:
+            return left / right
+        return self.deoptimize_binary(expr, left, right)
+
+    def floatless(self, expr: Binary):
+        left = self.eval(expr.left)
+        right = self.eval(expr.right)
+        if type(left) is float and type(right) is float:
+            return left < right
+        return self.deoptimize_binary(expr, left, right)
+
+    def floatlessequal(self, expr: Binary):
+        left = self.eval(expr.left)
+        right = self.eval(expr.right)
+        if type(left) is float and type(right) is float:
+            return left <= right
+        return self.deoptimize_binary(expr, left, right)
+
+    def floatgreater(self, expr: Binary):
+        left = self.eval(expr.left)
+        right = self.eval(expr.right)
+        if type(left) is float and type(right) is float:
+            return left > right
+        return self.deoptimize_binary(expr, left, right)
+
+    def floatgreaterequal(self, expr: Binary):
+        left = self.eval(expr.left)
+        right = self.eval(expr.right)
+        if type(left) is float and type(right) is float:
+            return left >= right
+        return self.deoptimize_binary(expr, left, right)
+
+    def stringconcat(self, expr: Binary):
+        left = self.eval(expr.left)
+        right = self.eval(expr.right)
+        if (type(left) is str or type(left) is Rope) and \
+                (type(right) is str or type(right) is Rope):
+            return concat(left, right)
+        return self.deoptimize_binary(expr, left, right)
+
+    def equal(self, expr: Binary):
+        return self.eval(expr.left) == self.eval(expr.right)
+
+    def notequal(self, expr: Binary):
+        return not self.eval(expr.left) == self.eval(expr.right)
+
+    def grouping(self, expr: Grouping):
+        return self.eval(expr.expression)
 
     def literal(self, expr: Literal):
         return expr.value
 
     def unary(self, expr: Unary):
         right = self.eval(expr.right)
+        if expr.warmup:
+            expr.warmup -= 1
+        elif expr.operator.ttype == TokenType.BANG:
+            expr.__class__ = BoolNot
+        elif type(right) is float:
+            expr.__class__ = FloatNegate
+        else:
+            expr.warmup = QUICKEN_BACKOFF
+        return self.unary_op(expr.operator.ttype, right)
 
-        op = expr.operator.ttype
+    def unary_op(self, op, right):
         if op == TokenType.BANG:
             return not self.is_truthy(right)
         if op == TokenType.MINUS:
@@ -130,10 +380,22 @@ class Interpreter:
         else:
             raise LoxRuntimeError("Unreachable")
 
+    def floatnegate(self, expr: Unary):
+        right = self.eval(expr.right)
+        if type(right) is float:
+            return -right
+        expr.__class__ = Unary
+        expr.warmup = QUICKEN_BACKOFF
+        return self.unary_op(expr.operator.ttype, right)
+
+    def boolnot(self, expr: Unary):
+        right = self.eval(expr.right)
+        return right is None or right is False
+
     def check_number(self, *args):
-        res = all(map(lambda x: isinstance(x, float), args))
-        if not res:
-            raise LoxRuntimeError("Operands must be numbers")
+        for x in args:
+            if not isinstance(x, float):
+                raise LoxRuntimeError("Operands must be numbers")
 
     def is_truthy(self, x):
         if x is None:
@@ -159,39 +421,96 @@ class Interpreter:
         if stmt.initalizer != None:
             val = self.eval(stmt.initalizer)
 
-        self.env.define(stmt.name.lexeme, val)
+        if stmt.slot is None:
+            self.globalenv.define(stmt.name.lexeme, val)
+        else:
+            self.env.values[stmt.slot] = val
 
         return None
 
     def variable(self, stmt: Variable):
-        val = self.env.get(stmt.name.lexeme)
+        if stmt.depth is None:
+            globalenv = self.globalenv
+            if stmt.gversion == globalenv.version or \
+                    globalenv.resolve(stmt) is not None:
+                val = globalenv.values[stmt.gindex]
+                if val is not None:
+                    return val
+            raise LoxRuntimeError(
+                f"Varname {stmt.name.lexeme} is never assigned")
+
+        val = self.env.ancestor(stmt.depth).values[stmt.slot]
         if val is None:
-            raise LoxRuntimeError('Variable is never assigned')
+            raise LoxRuntimeError(
+                f"Varname {stmt.name.lexeme} is never assigned")
         return val
 
     def assign(self, stmt: Assign):
         val = self.eval(stmt.val)
-        self.env.assign(stmt.name.lexeme, val)
+        if stmt.depth is None:
+            globalenv = self.globalenv
+            if stmt.gversion != globalenv.version and \
+                    globalenv.resolve(stmt) is None:
+                raise LoxRuntimeError(
+                    f'undefined variable {stmt.name.lexeme}, cannot assign {val}')
+            globalenv.values[stmt.gindex] = val
+        else:
+            self.env.ancestor(stmt.depth).values[stmt.slot] = val
         return val
 
     def block(self, stmt: Block):
+        if not stmt.size:
+            for s in stmt.statements:
+                if self.eval(s) is not None:
+                    return RETURN
+            return None
+
         prev = self.env
         try:
-            self.env = Environment(prev)
-            for stmt in stmt.statements:
-                self.eval(stmt)
+            self.env = Environment(prev, [None] * stmt.size)
+            for s in stmt.statements:
+                if self.eval(s) is not None:
+                    return RETURN
         finally:
             self.env = prev
 
     def ifstmt(self, stmt: IfStmt):
         if self.is_truthy(self.eval(stmt.cond)):
-            self.eval(stmt.then_branch)
+            return self.eval(stmt.then_branch)
         elif stmt.else_branch is not None:
-            self.eval(stmt.else_branch)
+            return self.eval(stmt.else_branch)
 
     def whilestmt(self, stmt: WhileStmt):
         while (self.is_truthy(self.eval(stmt.cond))):
-            self.eval(stmt.body)
+            if self.eval(stmt.body) is not None:
+                return RETURN
+
+    def functionstmt(self, stmt: FunctionStmt):
+        function = LoxFunction(stmt, self.env)
+        if stmt.slot is None:
+            self.globalenv.define(stmt.name.lexeme, function)
+        else:
+            self.env.values[stmt.slot] = function
+
+    def returnstmt(self, stmt: ReturnStmt):
+        value = stmt.value
+        if type(value) is Call:
+            callee = self.eval(value.calle)
+            arguments = []
+            for arg in value.arguments:
+                arguments.append(self.eval(arg))
+            if type(callee) is LoxFunction:
+                # Tail call: run by the loop in call_function in place of
+                # the current frame, so it takes no Python stack
+                self.tail_call = (callee, arguments)
+                return RETURN
+            self.return_value = self.call_value(callee, arguments)
+            return RETURN
+
+        self.return_value = None
+        if value is not None:
+            self.return_value = self.eval(value)
+        return RETURN
 
     def logical(self, stmt: Logical):
         left = self.eval(stmt.left)
@@ -211,8 +530,51 @@ class Interpreter:
         for arg in expr.arguments:
             arguments.append(self.eval(arg))
 
+        return self.call_value(callee, arguments)
+
+    def call_value(self, callee, arguments: list):
+        if type(callee) is LoxFunction:
+            return self.call_function(callee, arguments)
+        if type(callee) is NativeFunction:
+            if len(arguments) != callee.arity:
+                raise LoxRuntimeError(
+                    f"Expected {callee.arity} arguments but got {len(arguments)}.")
+            try:
+                return callee.fn(*arguments)
+            except NativeError as e:
+                raise LoxRuntimeError(str(e))
+
         function = callee
+        if not isinstance(function, LoxCallabe):
+            raise LoxRuntimeError("Can only call functions and classes.")
         if len(arguments) != function.arity():
             raise LoxRuntimeError(
-                f"Expected {function.arity()} arguments but got {arguments.size()}.")
+                f"Expected {function.arity()} arguments but got {len(arguments)}.")
         return function.call(*arguments)
+
+    def call_function(self, callee: LoxFunction, arguments: list):
+        prev = self.env
+        try:
+            while True:
+                decl = callee.declaration
+                if len(arguments) != len(decl.params):
+                    raise LoxRuntimeError(
+                        f"Expected {len(decl.params)} arguments but got {len(arguments)}.")
+
+                # The argument list becomes the frame: parameters are its
+                # first slots, the body's own locals follow
+                if decl.size > len(arguments):
+                    arguments.extend([None] * (decl.size - len(arguments)))
+                self.env = Environment(callee.closure, arguments)
+                for stmt in decl.body:
+                    if self.eval(stmt) is not None:
+                        break
+                else:
+                    return None
+
+                if self.tail_call is None:
+                    return self.return_value
+                callee, arguments = self.tail_call
+                self.tail_call = None
+        finally:
+            self.env = prev
@@ -0,0 +1,83 @@
+import hashlib
+import os
+import pickle
+import sys
+
+# Bump whenever the AST or bytecode format changes so stale caches are
+# ignored instead of being loaded into an incompatible interpreter
+FORMAT_VERSION = 5
+MAGIC = b'LOXC'
+CACHE_DIR = '__loxcache__'
+# Units are pickled this many at a time, so a cached script can run while
+# it is being loaded and executed units can be freed, as when it is parsed
+BATCH = 256
+
+
+def header(digest: bytes) -> bytes:
+    version = f"{FORMAT_VERSION}:{sys.version_info[0]}.{sys.version_info[1]}\n"
+    return MAGIC + version.encode() + digest
+
+
+def source_digest(source: str) -> bytes:
+    return hashlib.sha256(source.encode()).digest()
+
+
+# __loxcache__/<script>.<tag>.lxc next to the script, where tag encodes
+# everything besides the source that affects the compiled output
+def cache_path(script_path: str, tag: str, cache_dir=None) -> str:
+    directory, name = os.path.split(os.path.abspath(script_path))
+    if cache_dir is None:
+        cache_dir = os.path.join(directory, CACHE_DIR)
+    return os.path.join(cache_dir, f"{name}.{tag}.lxc")
+
+
+# Returns an iterator over the cached code, or None if it is missing,
+# stale or unreadable. Only the first batch is read here; the file was
+# written whole by store(), so the rest is read as it is needed.
+def load(path: str, digest: bytes):
+    expected = header(digest)
+    try:
+        f = open(path, 'rb')
+    except OSError:
+        return None
+    try:
+        if f.read(len(expected)) != expected:
+            f.close()
+            return None
+        first = pickle.load(f)
+    except Exception:
+        f.close()
+        return None
+    return batches(f, first)
+
+
+def batches(f, first):
+    with f:
+        yield from first
+        while True:
+            try:
+                batch = pickle.load(f)
+            except EOFError:
+                return
+            yield from batch
+
+
+# Best effort: a cache that can't be written just means a slower next run
+def store(path: str, digest: bytes, code) -> bool:
+    # Only needed after a cache miss, so kept out of the startup path
+    import tempfile
+    tmp = None
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(header(digest))
+            for i in range(0, max(len(code), 1), BATCH):
+                pickle.dump(code[i:i + BATCH], f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+        return True
+    except Exception:
+        if tmp is not None and os.path.exists(tmp):
+            os.unlink(tmp)
+        return False
@@ -0,0 +1,37 @@
+import json
+import os
+import socket
+import sys
+
+# Thin client for `main.py --serve`. It only imports the standard library
+# modules it needs, so its startup stays small next to the interpreter's.
+#   python loxclient.py SOCKET script.lox
+#   python loxclient.py SOCKET -          (source on stdin)
+
+
+def request(socket_path: str, message: dict) -> dict:
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(socket_path)
+        sock.sendall(json.dumps(message).encode() + b'\n')
+        sock.shutdown(socket.SHUT_WR)
+        with sock.makefile('rb') as f:
+            return json.loads(f.readline())
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        sys.exit(f"usage: {sys.argv[0]} SOCKET (script.lox | -)")
+    socket_path, script = sys.argv[1], sys.argv[2]
+    if script == '-':
+        message = {'source': sys.stdin.read()}
+    else:
+        message = {'path': os.path.abspath(script)}
+
+    try:
+        response = request(socket_path, message)
+    except OSError as e:
+        sys.exit(f"{socket_path}: {e.strerror}")
+    sys.stdout.write(response['stdout'])
+    if response['status'] == 'crash':
+        sys.stderr.write(response['error'])
+    sys.exit(0 if response['status'] == 'ok' else 1)
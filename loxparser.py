@@ -1,4 +1,4 @@
-from typing import List
+from collections.abc import Iterable, Iterator
 from scanner import Token, TokenType
 from expr import *
 
@@ -7,26 +7,72 @@ class LoxParserException(Exception):
     pass
 
 
+# Binding powers, lowest first
+PREC_NONE = -1
+PREC_ASSIGNMENT = 1
+PREC_OR = 2
+PREC_AND = 3
+PREC_EQUALITY = 4
+PREC_COMPARISON = 5
+PREC_TERM = 6
+PREC_FACTOR = 7
+PREC_UNARY = 8
+PREC_CALL = 9
+
+
 class Parser:
-    def __init__(self, tokens: List[Token]):
-        self.tokens = tokens
-        self.current = 0
+    # Tokens are pulled from any iterator on demand. The grammar needs one
+    # token of lookahead, so only the previous and the current token are
+    # kept around instead of the whole token list.
+    def __init__(self, tokens: Iterable[Token]):
+        self.tokens = iter(tokens)
+        self.last = None
+        self.lookahead = next(self.tokens)
+        self.had_error = False
+        self.function_depth = 0
     
-    def parse(self) -> List[Stmt]:
-        statements = []
+    def parse(self) -> list[Stmt]:
+        return list(self.parse_iter())
+
+    def parse_iter(self) -> Iterator[Stmt]:
         while not self.is_at_end():
-            statements.append(self.decl())
-        return statements
+            stmt = self.decl()
+            if stmt is not None:
+                yield stmt
     
     def decl(self):
         try:
             if self.match(TokenType.VAR):
                 return self.vardecl()
+            if self.match(TokenType.FUN):
+                return self.function('function')
             return self.statement()
         except LoxParserException as e:
-            print(e)
+            self.report(e)
+            self.had_error = True
             self.sync()
+
+    def report(self, error: LoxParserException):
+        print(error)
     
+    def function(self, kind):
+        name = self.consume(TokenType.IDENTIFIER, f'Expect {kind} name')
+        self.consume(TokenType.LEFT_PAREN, f'Expect "(" after {kind} name')
+        params = []
+        if not self.check(TokenType.RIGHT_PAREN):
+            params.append(self.consume(TokenType.IDENTIFIER, 'Expect parameter name'))
+            while self.match(TokenType.COMMA):
+                params.append(self.consume(TokenType.IDENTIFIER, 'Expect parameter name'))
+        self.consume(TokenType.RIGHT_PAREN, 'Expect ")" after parameters')
+
+        self.consume(TokenType.LEFT_BRACE, f'Expect "{{" before {kind} body')
+        self.function_depth += 1
+        try:
+            body = self.block().statements
+        finally:
+            self.function_depth -= 1
+        return FunctionStmt(name, params, body)
+
     def vardecl(self):
         name = self.consume(TokenType.IDENTIFIER, "Expect variable name")
 
@@ -48,8 +94,20 @@ class Parser:
             return self.whilestmt()
         if self.match(TokenType.FOR):
             return self.forstmt()
+        if self.match(TokenType.RETURN):
+            return self.returnstmt()
         return self.expression_statement()
     
+    def returnstmt(self):
+        keyword = self.previous()
+        if not self.function_depth:
+            raise LoxParserException("Can't return from top-level code")
+        value = None
+        if not self.check(TokenType.SEMICOLON):
+            value = self.expression()
+        self.consume(TokenType.SEMICOLON, 'Expect ";" after return value')
+        return ReturnStmt(keyword, value)
+
     def whilestmt(self):
         self.consume(TokenType.LEFT_PAREN, 'Expect "(" after "while"')
         cond = self.expression()
@@ -113,7 +171,9 @@ class Parser:
     def block(self):
         stmts = []
         while not self.check(TokenType.RIGHT_BRACE) and not self.is_at_end():
-            stmts.append(self.decl())
+            stmt = self.decl()
+            if stmt is not None:
+                stmts.append(stmt)
         self.consume(TokenType.RIGHT_BRACE, 'Expect } after block')
         return Block(stmts)
 
@@ -124,96 +184,64 @@ class Parser:
         return ExpressionStmt(expr)
 
 
+    # Expressions are parsed by precedence climbing over RULES below. Each
+    # token that can start an expression has a prefix method, each one
+    # that can continue it an infix method and the precedence it binds
+    # with; both get the token they were chosen by, already consumed.
     def expression(self) -> Expr:
-        return self.assignment()
-    
-    def assignment(self) -> Expr:
-        expr = self.or_stmt()
-        if self.match(TokenType.EQUAL):
-            equals = self.previous()
-            val = self.assignment()
-            if isinstance(expr, Variable):
-                name = expr.name
-                return Assign(name, val)
-            raise LoxParserException("Invalid assignment target")
-        return expr
-    
-    def or_stmt(self) -> Expr:
-        expr = self.and_stmt()
-        while self.match(TokenType.OR):
-            op = self.previous()
-            right = self.and_stmt()
-            expr = Logical(expr, op, right)
-        return expr
-
-    def and_stmt(self) -> Expr:
-        expr = self.equality()
-        while self.match(TokenType.AND):
-            op = self.previous()
-            right = self.equality()
-            expr = Logical(expr, op, right)
-        return expr
-
-    def equality(self) -> Expr:
-        expr = self.comparison()
-
-        while self.match(TokenType.BANG_EQUAL, TokenType.EQUAL_EQUAL):
-            operator = self.previous()
-            right = self.comparison()
-            expr = Binary(expr, operator, right)
-
-        return expr
-
-    def comparison(self) -> Expr:
-        expr = self.addition()
-
-        while self.match(
-                TokenType.GREATER,
-                TokenType.GREATER_EQUAL,
-                TokenType.LESS,
-                TokenType.LESS_EQUAL):
-            operator = self.previous()
-            right = self.addition()
-            expr = Binary(expr, operator, right)
-
-        return expr
-
-    def addition(self) -> Expr:
-        expr = self.multiplication()
-
-        while self.match(TokenType.PLUS, TokenType.MINUS):
-            operator = self.previous()
-            right = self.multiplication()
-            expr = Binary(expr, operator, right)
-
-        return expr
-
-    def multiplication(self) -> Expr:
-        expr = self.unary()
-
-        while self.match(TokenType.STAR, TokenType.SLASH):
-            operator = self.previous()
-            right = self.unary()
-            expr = Binary(expr, operator, right)
-
-        return expr
-
-    def unary(self) -> Expr:
-        if self.match(TokenType.BANG, TokenType.MINUS):
-            operator = self.previous()
-            right = self.unary()
-            return Unary(operator, right)
-        return self.call()
-    
-    def call(self) -> Expr:
-        expr = self.primary()
+        return self.parse_precedence(PREC_ASSIGNMENT)
+
+    def parse_precedence(self, precedence: int) -> Expr:
+        token = self.lookahead
+        prefix = RULES.get(token.ttype, NO_RULE)[0]
+        if prefix is None:
+            raise LoxParserException("Expect expr")
+        self.advance()
+        expr = prefix(self, token)
+
         while True:
-            if self.match(TokenType.LEFT_PAREN):
-                expr = self.finishcall(expr)
-            else:
-                break
-        return expr
-    
+            token = self.lookahead
+            _, infix, prec = RULES.get(token.ttype, NO_RULE)
+            if prec < precedence:
+                return expr
+            self.advance()
+            expr = infix(self, expr, token)
+
+    def literal(self, token: Token) -> Expr:
+        return Literal(token.literal)
+
+    def false(self, token: Token) -> Expr:
+        return Literal(False)
+
+    def true(self, token: Token) -> Expr:
+        return Literal(True)
+
+    def nil(self, token: Token) -> Expr:
+        return Literal(None)
+
+    def variable(self, token: Token) -> Expr:
+        return Variable(token)
+
+    def grouping(self, token: Token) -> Expr:
+        expr = self.expression()
+        self.consume(TokenType.RIGHT_PAREN, "Expect ')'")
+        return Grouping(expr)
+
+    def unary(self, operator: Token) -> Expr:
+        return Unary(operator, self.parse_precedence(PREC_UNARY))
+
+    # Binary operators are all left-associative
+    def binary(self, left: Expr, operator: Token) -> Expr:
+        right = self.parse_precedence(RULES[operator.ttype][2] + 1)
+        return Binary(left, operator, right)
+
+    def logical(self, left: Expr, op: Token) -> Expr:
+        right = self.parse_precedence(RULES[op.ttype][2] + 1)
+        return Logical(left, op, right)
+
+    def call(self, callee: Expr, paren: Token) -> Expr:
+        return self.finishcall(callee)
+
     def finishcall(self, callee) -> Expr:
         arguments = []
         if not self.check(TokenType.RIGHT_PAREN):
@@ -224,27 +252,13 @@ class Parser:
         paren = self.consume(TokenType.RIGHT_PAREN, 'Expect ")" after args')
         return Call(callee, paren, arguments)
 
-
-    def primary(self) -> Expr:
-        if self.match(TokenType.FALSE):
-            return Literal(False)
-        if self.match(TokenType.TRUE):
-            return Literal(True)
-        if self.match(TokenType.NIL):
-            return Literal(None)
-
-        if self.match(TokenType.NUMBER, TokenType.STRING):
-            return Literal(self.previous().literal)
-        
-        if self.match(TokenType.IDENTIFIER):
-            return Variable(self.previous())
-
-        if self.match(TokenType.LEFT_PAREN):
-            expr = self.expression()
-            self.consume(TokenType.RIGHT_PAREN, "Expect ')'")
-            return Grouping(expr)
-
-        print("Expect expr")
+    # Right-associative, and the target is only checked once the value
+    # has been parsed
+    def assign(self, target: Expr, equals: Token) -> Expr:
+        val = self.parse_precedence(PREC_ASSIGNMENT)
+        if isinstance(target, Variable):
+            return Assign(target.name, val)
+        raise LoxParserException("Invalid assignment target")
 
     def match(self, *args) -> bool:
         for ttype in args:
@@ -266,23 +280,24 @@ class Parser:
 
     def advance(self) -> Token:
         if not self.is_at_end():
-            self.current += 1
-        return self.previous()
+            self.last = self.lookahead
+            self.lookahead = next(self.tokens)
+        return self.last
 
     def previous(self) -> Token:
-        return self.tokens[self.current - 1]
+        return self.last
 
     def is_at_end(self) -> bool:
-        return self.peek().ttype == TokenType.EOF
+        return self.lookahead.ttype == TokenType.EOF
 
     def peek(self) -> Token:
-        return self.tokens[self.current]
+        return self.lookahead
 
     def sync(self):
         self.advance()
 
         while not self.is_at_end():
-            if self.previous() == TokenType.SEMICOLON:
+            if self.previous().ttype == TokenType.SEMICOLON:
                 break
             if self.peek().ttype in [
                 TokenType.CLASS,
@@ -296,3 +311,30 @@ class Parser:
             ]:
                 break
             self.advance()
+
+
+# TokenType -> (prefix, infix, precedence of the infix)
+NO_RULE = (None, None, PREC_NONE)
+RULES = {
+    TokenType.LEFT_PAREN: (Parser.grouping, Parser.call, PREC_CALL),
+    TokenType.MINUS: (Parser.unary, Parser.binary, PREC_TERM),
+    TokenType.PLUS: (None, Parser.binary, PREC_TERM),
+    TokenType.SLASH: (None, Parser.binary, PREC_FACTOR),
+    TokenType.STAR: (None, Parser.binary, PREC_FACTOR),
+    TokenType.BANG: (Parser.unary, None, PREC_NONE),
+    TokenType.BANG_EQUAL: (None, Parser.binary, PREC_EQUALITY),
+    TokenType.EQUAL: (None, Parser.assign, PREC_ASSIGNMENT),
+    TokenType.EQUAL_EQUAL: (None, Parser.binary, PREC_EQUALITY),
+    TokenType.GREATER: (None, Parser.binary, PREC_COMPARISON),
+    TokenType.GREATER_EQUAL: (None, Parser.binary, PREC_COMPARISON),
+    TokenType.LESS: (None, Parser.binary, PREC_COMPARISON),
+    TokenType.LESS_EQUAL: (None, Parser.binary, PREC_COMPARISON),
+    TokenType.IDENTIFIER: (Parser.variable, None, PREC_NONE),
+    TokenType.STRING: (Parser.literal, None, PREC_NONE),
+    TokenType.NUMBER: (Parser.literal, None, PREC_NONE),
+    TokenType.AND: (None, Parser.logical, PREC_AND),
+    TokenType.OR: (None, Parser.logical, PREC_OR),
+    TokenType.FALSE: (Parser.false, None, PREC_NONE),
+    TokenType.TRUE: (Parser.true, None, PREC_NONE),
+    TokenType.NIL: (Parser.nil, None, PREC_NONE),
+}
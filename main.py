@@ -1,51 +1,260 @@
 import argparse
+import os
+import sys
 import scanner
 import loxparser
-from interpreter import Interpreter
+
+# Only the scanner and parser are imported up front. Everything else is
+# imported where it is first needed, so a run pays for the engine and
+# features it uses and nothing more; see bench/startup.py.
+
+# Scripts at least this big are scanned from a memory map instead of
+# being read into a string
+MMAP_THRESHOLD = 16 * 1024 * 1024
+
+# Scripts smaller than this skip the disk cache. Hashing the source and
+# importing pickle and the engine's node classes costs more than scanning
+# and parsing a few thousand lines; see bench/cache.py.
+CACHE_THRESHOLD = 32 * 1024
 
 class Lox:
-    def __init__(self, debug):
+    def __init__(self, debug, engine='tree', scanner_mode='regex', opt_level=0,
+                 use_cache=False, profile=False):
         self.had_error = False
         self.debug = debug
-        self.interpreter = Interpreter()
+        self.engine = engine
+        self.opt_level = opt_level
+        self.use_cache = use_cache and not debug
+        if scanner_mode == 'classic':
+            self.scanner_class = scanner.Scanner
+        else:
+            self.scanner_class = scanner.RegexScanner
+        if engine == 'vm':
+            from vm import VM
+            self.interpreter = VM()
+        elif profile:
+            from profiler import ProfilingInterpreter
+            self.interpreter = ProfilingInterpreter()
+        else:
+            from interpreter import Interpreter
+            self.interpreter = Interpreter()
     
     def run_file(self, s):
-        with open(s) as f:
-            self.run(f.read())
+        size = os.path.getsize(s)
+        if size >= MMAP_THRESHOLD:
+            self.run_mapped(s)
+        else:
+            # UTF-8 whatever the locale, as MappedScanner decodes it
+            with open(s, encoding='utf-8') as f:
+                source = f.read()
+            if self.use_cache and size >= CACHE_THRESHOLD:
+                self.run_cached(s, source)
+            else:
+                self.run(source)
         if self.had_error:
             print("Error in lox interpreter")
+
+    # The source is never decoded as a whole, and statements are dropped
+    # once executed. The disk cache is skipped: storing the code would mean
+    # keeping all of it in memory until the end.
+    def run_mapped(self, path):
+        import mmap
+        with open(path, 'rb') as f, \
+                mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as source:
+            units = self.compile(source, scanner.MappedScanner)
+            try:
+                self.interpreter.interpret(units)
+                drain(units)
+            finally:
+                # The scanner's regex holds on to the map until closed
+                units.close()
+
+    def run_source(self, source):
+        self.run(source)
+        if self.had_error:
+            print("Error in lox interpreter")
+    # Input is read until it ends outside any string, comment or
+    # declaration, so a declaration can span several lines. Each line
+    # only re-parses the declaration it continues.
     def run_prompt(self):
+        import incremental
         while True:
-            self.run(input('lox> '))
-            self.had_error = False
+            doc = incremental.Document()
+            prompt = 'lox> '
+            while True:
+                try:
+                    line = input(prompt)
+                except EOFError:
+                    print()
+                    return None
+                doc.edit(len(doc.source), len(doc.source), line + '\n')
+                if doc.is_complete():
+                    break
+                prompt = '...  '
+
+            for line, message in doc.errors():
+                print(message)
+            self.interpreter.interpret(self.lower(doc.statements()))
     def run(self, s):
-        scan = scanner.Scanner(s)
-        tokens = scan.scan_tokens()
+        units = self.compile(s)
+        try:
+            self.interpreter.interpret(units)
+            drain(units)
+        finally:
+            units.close()
+
+    def run_cached(self, path, source):
+        import loxcache
+        digest = loxcache.source_digest(source)
+        cache_file = loxcache.cache_path(
+            path, f"{self.engine}-O{self.opt_level}")
+        code = loxcache.load(cache_file, digest)
+        if code is not None:
+            try:
+                self.interpreter.interpret(code)
+            finally:
+                code.close()
+            return None
+
+        code = []
+        units = self.compile(source)
+        try:
+            self.interpreter.interpret(collect(units, code))
+            # A runtime error stops execution early; compile the rest anyway
+            code.extend(units)
+        finally:
+            units.close()
+        if not self.had_error:
+            loxcache.store(cache_file, digest, code)
+
+    # Yields whatever the engine executes: resolved statements for the
+    # tree-walker, chunks for the VM
+    def compile(self, s, scanner_class=None):
+        scan = (scanner_class or self.scanner_class)(s)
+        tokens = scan.iter_tokens()
 
         if self.debug:
+            tokens = list(tokens)
             print("Tokens debug: ")
             for tok in tokens:
                 print(tok)
         
+        # Statements are executed as soon as they are parsed
         parser = loxparser.Parser(tokens)
-        stmts = parser.parse()
-        
+        try:
+            yield from self.lower(parser.parse_iter())
+        finally:
+            if parser.had_error:
+                self.had_error = True
+
+    def lower(self, stmts):
+        if self.opt_level:
+            from optimizer import Optimizer
+            stmts = Optimizer(self.opt_level).optimize(stmts)
+
         if self.debug:
+            stmts = list(stmts)
             print("AST debug: ")
             print(stmts)
 
-        self.interpreter.interpret(stmts)
+        if self.engine == 'vm':
+            yield from self.compiled(stmts)
+        else:
+            yield from self.resolved(stmts)
+
+    def resolved(self, stmts):
+        from resolver import Resolver
+        resolver = Resolver()
+        for stmt in stmts:
+            resolver.resolve([stmt])
+            yield stmt
+
+    def compiled(self, stmts):
+        from compiler import Compiler
+        for stmt in stmts:
+            chunk = Compiler().compile([stmt])
+            if self.debug:
+                print("Bytecode debug: ")
+                chunk.disassemble()
+            yield chunk
+
+# Compiles what a runtime error left unexecuted, so that syntax errors
+# further on are still reported
+def drain(units):
+    for _ in units:
+        pass
+
+def collect(units, into):
+    for unit in units:
+        into.append(unit)
+        yield unit
 
 if __name__ == "__main__":
     argparser = argparse.ArgumentParser()
     argparser.add_argument('--debug', help='show tokens and AST', action='store_true')
+    argparser.add_argument('--engine', help='execution engine',
+                           choices=['tree', 'vm'], default='tree')
+    argparser.add_argument('--scanner', help='tokenizer implementation',
+                           choices=['regex', 'classic'], default='regex')
+    argparser.add_argument('-O', dest='opt_level', type=int, choices=[0, 1, 2],
+                           default=0, help='1: fold constants and remove dead '
+                           'code, 2: also hoist loop-invariant expressions')
+    argparser.add_argument('--no-cache', action='store_true',
+                           help="don't read or write __loxcache__")
+    argparser.add_argument('--profile', action='store_true',
+                           help='print time spent per node type and line')
+    argparser.add_argument('--profile-out', metavar='FILE',
+                           help='also write collapsed stacks for flamegraphs')
+    argparser.add_argument('--batch', metavar='DIR',
+                           help='run every .lox script under DIR')
+    argparser.add_argument('--jobs', type=int, default=os.cpu_count(),
+                           help='worker processes for --batch')
+    argparser.add_argument('--report', metavar='FILE',
+                           help='write the --batch results as JSON')
+    argparser.add_argument('--serve', metavar='SOCKET',
+                           help='run scripts sent by loxclient.py over a Unix socket')
     argparser.add_argument('script', nargs='?', type=str, default='repl')
     args = argparser.parse_args()
 
-    lox = Lox(args.debug)
+    if args.serve:
+        if args.debug or args.profile or args.profile_out:
+            argparser.error('--serve cannot be combined with --debug or --profile')
+        import daemon
+        daemon.serve(args.serve, {
+            'engine': args.engine, 'scanner_mode': args.scanner,
+            'opt_level': args.opt_level, 'use_cache': not args.no_cache})
+        sys.exit(0)
+
+    if args.batch:
+        if args.debug or args.profile or args.profile_out:
+            argparser.error('--batch cannot be combined with --debug or --profile')
+        import batch
+        options = {'engine': args.engine, 'scanner_mode': args.scanner,
+                   'opt_level': args.opt_level, 'use_cache': not args.no_cache}
+        report = batch.run_batch(batch.find_scripts(args.batch),
+                                 max(1, args.jobs), options)
+        batch.print_summary(report)
+        if args.report:
+            import json
+            with open(args.report, 'w') as f:
+                json.dump(report, f, indent=2)
+        sys.exit(1 if report['failed'] else 0)
+
+    profile = args.profile or args.profile_out is not None
+    if profile and args.engine != 'tree':
+        argparser.error('--profile requires --engine tree')
+
+    lox = Lox(args.debug, args.engine, args.scanner, args.opt_level,
+              use_cache=not args.no_cache, profile=profile)
 
-    if args.script == 'repl':
-        lox.run_prompt()
-    else:
-        script_path = args.script
-        lox.run_file(script_path)
+    try:
+        if args.script == 'repl':
+            lox.run_prompt()
+        else:
+            script_path = args.script
+            lox.run_file(script_path)
+    finally:
+        if profile:
+            lox.interpreter.report()
+            if args.profile_out:
+                lox.interpreter.write_collapsed(args.profile_out)
@@ -0,0 +1,156 @@
+import functools
+import importlib
+import math
+import time
+from rope import Rope
+
+
+# Errors raised by builtins; the interpreter and the VM report them as Lox
+# runtime errors
+class NativeError(Exception):
+    pass
+
+
+# A builtin bound into the globals. Call sites test for this type and call
+# fn directly with the argument values, after comparing the argument count
+# with arity. fn starts out as a loader that imports the implementing
+# module on the first call, so unused builtins cost nothing at startup.
+# Builtins that call back into Lox code are bound to the interpreter or VM
+# running them, which fn then gets as its first argument.
+class NativeFunction:
+    __slots__ = ('name', 'arity', 'module', 'function', 'fn', 'engine')
+
+    def __init__(self, name: str, module: str, function: str, arity: int,
+                 engine=None):
+        self.name = name
+        self.arity = arity
+        self.module = module
+        self.function = function
+        self.engine = engine
+        self.fn = self.load
+
+    def load(self, *arguments):
+        fn = getattr(importlib.import_module(self.module), self.function)
+        if self.engine is not None:
+            fn = functools.partial(fn, self.engine)
+        self.fn = fn
+        return fn(*arguments)
+
+    # Pickles unloaded and unbound, e.g. when a Lox function holding one
+    # is sent to a worker by parallel()
+    def __reduce__(self):
+        return (NativeFunction, (self.name, self.module, self.function, self.arity))
+
+    def __repr__(self):
+        return "<native fn>"
+
+
+def clock():
+    return time.time()
+
+
+def check_number(x) -> float:
+    if type(x) is not float:
+        raise NativeError("Expected a number")
+    return x
+
+
+def sqrt(x):
+    x = check_number(x)
+    if x < 0.0:
+        raise NativeError("Expected a non-negative number")
+    return math.sqrt(x)
+
+
+def floor(x):
+    return float(math.floor(check_number(x)))
+
+
+def abs_(x):
+    return abs(check_number(x))
+
+
+def min_(a, b):
+    return min(check_number(a), check_number(b))
+
+
+def max_(a, b):
+    return max(check_number(a), check_number(b))
+
+
+# The text print would show for x
+def to_string(x):
+    return str(x)
+
+
+# Parses a number; nil if s isn't one
+def to_number(s):
+    if type(s) is not str:
+        s = to_string(s)
+    try:
+        return float(s)
+    except ValueError:
+        return None
+
+
+# Strings and arrays
+def length(x):
+    if not hasattr(x, '__len__'):
+        raise NativeError("Expected a string or an array")
+    return float(len(x))
+
+
+def substr(s, start, end):
+    if type(s) is not str and type(s) is not Rope:
+        raise NativeError("Expected a string")
+    s = str(s)
+    if type(start) is not float or type(end) is not float or \
+            not start.is_integer() or not end.is_integer():
+        raise NativeError("Expected a whole number")
+    return s[int(start):int(end)]
+
+
+# Lox name -> (module, function, arity)
+REGISTRY = {
+    # time
+    'clock': ('natives', 'clock', 0),
+    # math
+    'sqrt': ('natives', 'sqrt', 1),
+    'floor': ('natives', 'floor', 1),
+    'abs': ('natives', 'abs_', 1),
+    'min': ('natives', 'min_', 2),
+    'max': ('natives', 'max_', 2),
+    # strings
+    'str': ('natives', 'to_string', 1),
+    'num': ('natives', 'to_number', 1),
+    'len': ('natives', 'length', 1),
+    'substr': ('natives', 'substr', 3),
+    # numeric arrays
+    'array': ('arrays', 'new_array', 1),
+    'range': ('arrays', 'arange', 2),
+    'get': ('arrays', 'get', 2),
+    'set': ('arrays', 'set_', 3),
+    'fill': ('arrays', 'fill', 2),
+    'sum': ('arrays', 'sum_', 1),
+    'dot': ('arrays', 'dot', 2),
+    'slice': ('arrays', 'slice_', 3),
+    'map': ('arrays', 'map_', 3),
+}
+
+# One instance per builtin, shared by every interpreter and VM so a module
+# is only loaded once per process
+NATIVES = {name: NativeFunction(name, *entry) for name, entry in REGISTRY.items()}
+
+# Builtins bound to the engine that runs them; each engine gets its own
+ENGINE_REGISTRY = {
+    # parallel loops
+    'parallel': ('parallel', 'parallel', 4),
+}
+
+
+def bind(env, engine=None):
+    for name, native in NATIVES.items():
+        env.define(name, native)
+    if engine is not None:
+        for name, entry in ENGINE_REGISTRY.items():
+            env.define(name, NativeFunction(name, *entry, engine=engine))
@@ -0,0 +1,267 @@
+from copy import deepcopy
+from collections.abc import Iterable, Iterator
+from expr import *
+from scanner import Token, TokenType
+
+
+# AST to AST rewrites applied between parsing and execution.
+#   level 1: constant folding, dead branch removal, block flattening
+#   level 2: also hoists loop-invariant pure expressions out of loops
+class Optimizer:
+    def __init__(self, level: int = 1):
+        self.level = level
+        self.temps = 0
+
+    def optimize(self, stmts: Iterable[Stmt]) -> Iterator[Stmt]:
+        for stmt in stmts:
+            yield from self.flatten([self.visit(stmt)])
+
+    def visit(self, node):
+        if node is None:
+            return None
+        attr = node.__class__.__name__.lower()
+        return getattr(self, attr)(node)
+
+    # Drops removed statements and splices in blocks that don't need a scope
+    def flatten(self, stmts):
+        out = []
+        for stmt in stmts:
+            if stmt is None:
+                continue
+            if isinstance(stmt, Block) and not stmt.has_declarations():
+                out.extend(stmt.statements)
+            else:
+                out.append(stmt)
+        return out
+
+    def block(self, stmt: Block):
+        stmt.statements = self.flatten(self.visit(s) for s in stmt.statements)
+        if len(stmt.statements) == 1 and not stmt.has_declarations():
+            return stmt.statements[0]
+        return stmt
+
+    def varstmt(self, stmt: VarStmt):
+        stmt.initalizer = self.visit(stmt.initalizer)
+        return stmt
+
+    def functionstmt(self, stmt: FunctionStmt):
+        stmt.body = self.flatten(self.visit(s) for s in stmt.body)
+        return stmt
+
+    def returnstmt(self, stmt: ReturnStmt):
+        stmt.value = self.visit(stmt.value)
+        return stmt
+
+    def expressionstmt(self, stmt: ExpressionStmt):
+        stmt.expression = self.visit(stmt.expression)
+        if isinstance(stmt.expression, Literal):
+            return None
+        return stmt
+
+    def printstmt(self, stmt: PrintStmt):
+        stmt.expression = self.visit(stmt.expression)
+        return stmt
+
+    def ifstmt(self, stmt: IfStmt):
+        stmt.cond = self.visit(stmt.cond)
+        stmt.then_branch = self.statement(stmt.then_branch)
+        stmt.else_branch = self.visit(stmt.else_branch)
+        if isinstance(stmt.cond, Literal):
+            if is_truthy(stmt.cond.value):
+                return stmt.then_branch
+            return stmt.else_branch
+        return stmt
+
+    def whilestmt(self, stmt: WhileStmt):
+        stmt.cond = self.visit(stmt.cond)
+        if isinstance(stmt.cond, Literal) and not is_truthy(stmt.cond.value):
+            return None
+        stmt.body = self.statement(stmt.body)
+        if self.level >= 2:
+            return self.hoist(stmt)
+        return stmt
+
+    # Statement positions that can't be left empty
+    def statement(self, stmt):
+        stmt = self.visit(stmt)
+        if stmt is None:
+            return Block([])
+        return stmt
+
+    def grouping(self, expr: Grouping):
+        return self.visit(expr.expression)
+
+    def literal(self, expr: Literal):
+        return expr
+
+    def variable(self, expr: Variable):
+        return expr
+
+    def assign(self, expr: Assign):
+        expr.val = self.visit(expr.val)
+        return expr
+
+    def call(self, expr: Call):
+        expr.calle = self.visit(expr.calle)
+        expr.arguments = [self.visit(arg) for arg in expr.arguments]
+        return expr
+
+    def logical(self, expr: Logical):
+        expr.left = self.visit(expr.left)
+        expr.right = self.visit(expr.right)
+        if isinstance(expr.left, Literal):
+            left_wins = is_truthy(expr.left.value)
+            if expr.op.ttype != TokenType.OR:
+                left_wins = not left_wins
+            return expr.left if left_wins else expr.right
+        return expr
+
+    def unary(self, expr: Unary):
+        expr.right = self.visit(expr.right)
+        if not isinstance(expr.right, Literal):
+            return expr
+
+        val = expr.right.value
+        if expr.operator.ttype == TokenType.BANG:
+            return Literal(not is_truthy(val))
+        if isinstance(val, float):
+            return Literal(-val)
+        return expr
+
+    def binary(self, expr: Binary):
+        expr.left = self.visit(expr.left)
+        expr.right = self.visit(expr.right)
+        if isinstance(expr.left, Literal) and isinstance(expr.right, Literal):
+            folded = fold_binary(
+                expr.operator.ttype, expr.left.value, expr.right.value)
+            if folded is not None:
+                return Literal(folded)
+        return expr
+
+    # Rewrites `while (c) body` into
+    #   if (c) { var $inv0 = e; ...; while (c) body' }
+    # where every invariant expression e in c and body is replaced with a
+    # read of its temporary. The guard keeps the hoisted expressions from
+    # being evaluated when the loop would not run at all. Hoisted
+    # expressions always run, so they are only taken from code that runs on
+    # every iteration anyway: an expression that raises (10 / d, s - 1)
+    # must not be moved out of a branch that never runs.
+    def hoist(self, stmt: WhileStmt):
+        if any(isinstance(node, Call) for node in walk(stmt)):
+            return stmt
+        if any(isinstance(node, Assign) for node in walk(stmt.cond)):
+            return stmt
+
+        assigned = set()
+        for node in walk(stmt):
+            if isinstance(node, (Assign, VarStmt, FunctionStmt)):
+                assigned.add(node.name.lexeme)
+
+        hoisted = []
+        guard = deepcopy(stmt.cond)
+        stmt.cond = self.hoist_expr(stmt.cond, assigned, hoisted)
+        body = stmt.body.statements if isinstance(stmt.body, Block) else [stmt.body]
+        for s in body:
+            if not self.hoist_stmt(s, assigned, hoisted):
+                break
+        if not hoisted:
+            return stmt
+        return IfStmt(guard, Block(hoisted + [stmt]), None)
+
+    # Hoists from a top-level statement of the loop body. Branches, nested
+    # loops and returns may skip what follows them, so hoisting stops at
+    # the first one. It also stops after the first statement with a visible
+    # effect: a hoisted expression that raises must not raise before it.
+    def hoist_stmt(self, stmt, assigned, hoisted) -> bool:
+        if isinstance(stmt, (ExpressionStmt, PrintStmt)):
+            stmt.expression = self.hoist_expr(stmt.expression, assigned, hoisted)
+        elif isinstance(stmt, VarStmt):
+            stmt.initalizer = self.hoist_expr(stmt.initalizer, assigned, hoisted)
+        else:
+            return False
+        return not has_effect(stmt)
+
+    def hoist_expr(self, expr, assigned, hoisted):
+        # Only Binary and Unary results are hoisted: they are never nil,
+        # which the interpreter would report as an unassigned variable
+        if isinstance(expr, (Binary, Unary)) and is_invariant(expr, assigned) \
+                and any(isinstance(node, Variable) for node in walk(expr)):
+            line = next(n.name.line for n in walk(expr) if isinstance(n, Variable))
+            name = Token(TokenType.IDENTIFIER, f"$inv{self.temps}", None, line)
+            self.temps += 1
+            hoisted.append(VarStmt(name, expr))
+            return Variable(name)
+
+        if isinstance(expr, Binary):
+            expr.left = self.hoist_expr(expr.left, assigned, hoisted)
+            expr.right = self.hoist_expr(expr.right, assigned, hoisted)
+        elif isinstance(expr, Logical):
+            # The right side only runs depending on the left
+            expr.left = self.hoist_expr(expr.left, assigned, hoisted)
+        elif isinstance(expr, Unary):
+            expr.right = self.hoist_expr(expr.right, assigned, hoisted)
+        elif isinstance(expr, Grouping):
+            expr.expression = self.hoist_expr(expr.expression, assigned, hoisted)
+        elif isinstance(expr, Assign):
+            expr.val = self.hoist_expr(expr.val, assigned, hoisted)
+        return expr
+
+
+def is_truthy(x):
+    if x is None:
+        return False
+    if isinstance(x, bool):
+        return x
+    return True
+
+
+# Mirrors Interpreter.binary; returns None when the operation has to be
+# left for runtime (it would raise, or the result isn't a plain value)
+def fold_binary(op, left, right):
+    if op == TokenType.EQUAL_EQUAL:
+        return left == right
+    if op == TokenType.BANG_EQUAL:
+        return not left == right
+    if op == TokenType.PLUS and isinstance(left, str) and isinstance(right, str):
+        return left + right
+    if not (isinstance(left, float) and isinstance(right, float)):
+        return None
+    if op == TokenType.PLUS:
+        return left + right
+    if op == TokenType.MINUS:
+        return left - right
+    if op == TokenType.STAR:
+        return left * right
+    if op == TokenType.SLASH:
+        return left / right if right != 0.0 else None
+    if op == TokenType.GREATER:
+        return left > right
+    if op == TokenType.GREATER_EQUAL:
+        return left >= right
+    if op == TokenType.LESS:
+        return left < right
+    if op == TokenType.LESS_EQUAL:
+        return left <= right
+    return None
+
+
+# Calls never get this far: loops with calls aren't hoisted from at all
+def has_effect(stmt) -> bool:
+    if isinstance(stmt, PrintStmt):
+        return True
+    return any(isinstance(node, (Assign, Call)) for node in walk(stmt))
+
+
+def is_invariant(expr, assigned) -> bool:
+    if isinstance(expr, Literal):
+        return True
+    if isinstance(expr, Variable):
+        return expr.name.lexeme not in assigned
+    if isinstance(expr, Grouping):
+        return is_invariant(expr.expression, assigned)
+    if isinstance(expr, Unary):
+        return is_invariant(expr.right, assigned)
+    if isinstance(expr, (Binary, Logical)):
+        return is_invariant(expr.left, assigned) and \
+            is_invariant(expr.right, assigned)
+    return False
@@ -0,0 +1,147 @@
+import atexit
+import itertools
+import math
+import os
+import pickle
+import sys
+import tempfile
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+import arrays
+from arrays import LoxArray, check_int
+from interpreter import Interpreter, DEEP_RECURSION, RECURSION_LIMIT
+from natives import NativeFunction, NativeError
+
+# parallel(fn, start, end, reduction) calls fn(i) for every whole number i
+# from start up to end and combines the results with reduction: "sum",
+# "min" or "max" of the numbers returned, or "collect" for an array of
+# them in order. The range is split into parts that run on a pool of
+# worker processes. Each worker gets a pickled copy of fn and of the
+# globals as they were at the call, so iterations must be independent:
+# their assignments to globals are lost and whatever they print goes to the
+# worker's stdout.
+
+REDUCTIONS = ('sum', 'min', 'max', 'collect')
+
+# Worker processes; with one, and inside a worker, the loop runs in the
+# calling process
+JOBS = os.cpu_count()
+
+# Runs in the calling process nest: each one calls back into Lox from
+# inside a C call, which takes C stack that RECURSION_LIMIT doesn't
+# account for. Past this depth they raise RecursionError, which the
+# engines report as a stack overflow, instead of crashing the process.
+MAX_NESTING = 1000
+
+_nesting = 0
+_pool = None
+_calls = itertools.count()
+# In a worker: (path, engine, fn, reduction) for the call it last loaded,
+# so a call's payload is read once per worker rather than once per part
+_loaded = (None, None, None, None)
+_in_worker = False
+
+
+def parallel(engine, fn, start, end, reduction):
+    start, end = check_int(start), check_int(end)
+    if reduction not in REDUCTIONS:
+        raise NativeError(f"Unknown reduction {reduction}")
+
+    if _in_worker or JOBS <= 1 or end - start <= 1:
+        global _nesting
+        if _nesting >= MAX_NESTING:
+            raise RecursionError("parallel() nested too deeply")
+        _nesting += 1
+        try:
+            part = reduce_part(engine, fn, start, end, reduction)
+        finally:
+            _nesting -= 1
+        return combine([part], reduction)
+
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=JOBS)
+        atexit.register(_pool.shutdown)
+    # The function and globals reach the workers through a file that each
+    # reads once per call, so a part is sent as just its range
+    payload = pickle.dumps((not isinstance(engine, Interpreter),
+                            global_values(engine), fn, reduction))
+    fd, path = tempfile.mkstemp(prefix=f'loxparallel-{os.getpid()}-{next(_calls)}-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(payload)
+        # A few parts per worker evens out iterations of different cost
+        parts = min(JOBS * 4, end - start)
+        bounds = [start + (end - start) * k // parts for k in range(parts + 1)]
+        results = list(_pool.map(run_part, itertools.repeat(path),
+                                 bounds[:-1], bounds[1:]))
+    finally:
+        os.unlink(path)
+    return combine(results, reduction)
+
+
+def global_values(engine):
+    table = engine.globalenv if isinstance(engine, Interpreter) else engine.globals
+    return {name: table.values[index] for name, index in table.names.items()}
+
+
+def run_part(path, start, end):
+    global _loaded, _in_worker
+    if _loaded[0] != path:
+        _in_worker = True
+        with open(path, 'rb') as f:
+            is_vm, values, fn, reduction = pickle.load(f)
+        if is_vm:
+            from vm import VM
+            engine = VM()
+            table = engine.globals
+        else:
+            engine = Interpreter()
+            table = engine.globalenv
+            if DEEP_RECURSION:
+                sys.setrecursionlimit(max(sys.getrecursionlimit(), RECURSION_LIMIT))
+        # Builtins arrive unbound, under whatever name they were stored;
+        # each is replaced with this worker's own
+        builtins = {name: table.values[index] for name, index in table.names.items()}
+        for name, value in values.items():
+            if type(value) is NativeFunction:
+                value = builtins[value.name]
+            table.define(name, value)
+        if type(fn) is NativeFunction:
+            fn = builtins[fn.name]
+        _loaded = (path, engine, fn, reduction)
+    try:
+        return reduce_part(*_loaded[1:3], start, end, _loaded[3])
+    finally:
+        sys.stdout.flush()
+
+
+def reduce_part(engine, fn, start, end, reduction):
+    call = engine.call_value
+    results = []
+    for i in range(start, end):
+        result = call(fn, [float(i)])
+        if type(result) is not float:
+            raise NativeError("Expected a number from each iteration")
+        results.append(result)
+    if reduction == 'sum':
+        return math.fsum(results)
+    if reduction == 'min':
+        return min(results, default=None)
+    if reduction == 'max':
+        return max(results, default=None)
+    return results
+
+
+def combine(parts, reduction):
+    if reduction == 'sum':
+        return math.fsum(parts)
+    if reduction == 'collect':
+        values = list(itertools.chain.from_iterable(parts))
+        if arrays.numpy is not None:
+            return LoxArray(arrays.numpy.array(values, dtype=float))
+        return LoxArray(array('d', values))
+    parts = [part for part in parts if part is not None]
+    if not parts:
+        return None
+    return min(parts) if reduction == 'min' else max(parts)
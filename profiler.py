@@ -0,0 +1,146 @@
+from time import perf_counter
+from expr import *
+from interpreter import Interpreter
+
+
+# Tree-walker that times every eval() dispatch. It is only instantiated
+# for --profile, so the plain Interpreter keeps its hot path untouched.
+class ProfilingInterpreter(Interpreter):
+    def __init__(self):
+        super().__init__()
+        self.by_type = {}    # node type -> [calls, total, self]
+        self.by_line = {}    # line -> [calls, self]
+        self.stacks = {}     # stack id -> self time
+        # Flamegraph frames are Lox function calls. Call stacks are interned
+        # as a trie, (parent id, frame) -> id, and a function already on the
+        # stack doesn't get a new frame, so recursion folds into one frame
+        # and the number of stacks doesn't grow with its depth.
+        self.stack_ids = {}
+        self.stack_parents = [None]
+        self.stack = [0]
+        self.call_frames = []
+        self.on_stack = {}
+        self.lines_seen = []
+        self.child_time = [0.0]
+        self.active = {}
+        self.lines = {}
+
+    def call_function(self, callee, arguments):
+        self.enter(callee)
+        try:
+            return super().call_function(callee, arguments)
+        finally:
+            self.leave()
+
+    # A tail call runs in the caller's call_function loop; its frame
+    # replaces the caller's, as in the VM
+    def returnstmt(self, stmt):
+        result = super().returnstmt(stmt)
+        if self.tail_call is not None:
+            self.leave()
+            self.enter(self.tail_call[0])
+        return result
+
+    def enter(self, callee):
+        name = callee.declaration.name
+        frame = f"{name.lexeme}:{name.line}"
+        stack_id = self.stack[-1]
+        if not self.on_stack.get(frame):
+            key = (stack_id, frame)
+            stack_id = self.stack_ids.get(key)
+            if stack_id is None:
+                stack_id = self.stack_ids[key] = len(self.stack_parents)
+                self.stack_parents.append(key)
+        self.on_stack[frame] = self.on_stack.get(frame, 0) + 1
+        self.stack.append(stack_id)
+        self.call_frames.append(frame)
+
+    def leave(self):
+        self.on_stack[self.call_frames.pop()] -= 1
+        self.stack.pop()
+
+    def eval(self, expr):
+        kind = expr.__class__.__name__
+        line = self.line_of(expr)
+        if line is None:
+            line = self.lines_seen[-1] if self.lines_seen else 0
+        self.lines_seen.append(line)
+        stack_id = self.stack[-1]
+        self.child_time.append(0.0)
+        self.active[kind] = self.active.get(kind, 0) + 1
+        start = perf_counter()
+        try:
+            return super().eval(expr)
+        finally:
+            elapsed = perf_counter() - start
+            own = elapsed - self.child_time.pop()
+            self.child_time[-1] += elapsed
+            self.active[kind] -= 1
+
+            stats = self.by_type.get(kind)
+            if stats is None:
+                stats = self.by_type[kind] = [0, 0.0, 0.0]
+            stats[0] += 1
+            # Nested nodes of the same type are already inside the
+            # outermost one's total
+            if not self.active[kind]:
+                stats[1] += elapsed
+            stats[2] += own
+
+            stats = self.by_line.get(line)
+            if stats is None:
+                stats = self.by_line[line] = [0, 0.0]
+            stats[0] += 1
+            stats[1] += own
+
+            self.stacks[stack_id] = self.stacks.get(stack_id, 0.0) + own
+            self.lines_seen.pop()
+
+    # Nodes without a token of their own take the line of the first token
+    # below them, or of their parent if there is none. The node is kept in
+    # the memo so its id stays unique.
+    def line_of(self, node):
+        memo = self.lines.get(id(node))
+        if memo is not None:
+            return memo[1]
+        line = None
+        for n in walk(node):
+            token = token_of(n)
+            if token is not None:
+                line = token.line
+                break
+        self.lines[id(node)] = (node, line)
+        return line
+
+    def report(self, limit=15):
+        print()
+        print(f"{'node type':<16} {'calls':>10} {'total ms':>10} {'self ms':>10}")
+        rows = sorted(self.by_type.items(), key=lambda kv: -kv[1][2])
+        for kind, (calls, total, own) in rows:
+            print(f"{kind:<16} {calls:>10} {total * 1e3:>10.2f} {own * 1e3:>10.2f}")
+
+        print()
+        print(f"{'line':<16} {'calls':>10} {'self ms':>10}")
+        rows = sorted(self.by_line.items(), key=lambda kv: -kv[1][1])
+        for line, (calls, own) in rows[:limit]:
+            print(f"{line:<16} {calls:>10} {own * 1e3:>10.2f}")
+
+    # Collapsed stacks ("frame;frame;frame value") as read by flamegraph.pl
+    # and speedscope; values are self time in microseconds. Parents have
+    # lower ids than their children, so each stack's text extends its
+    # parent's.
+    def write_collapsed(self, path):
+        names = ['<script>']
+        for parent, frame in self.stack_parents[1:]:
+            names.append(f"{names[parent]};{frame}")
+        with open(path, 'w') as f:
+            for stack_id, own in self.stacks.items():
+                f.write(f"{names[stack_id]} {round(own * 1e6)}\n")
+
+
+def token_of(node):
+    for field in ('name', 'operator', 'op', 'paren', 'keyword'):
+        token = getattr(node, field, None)
+        if token is not None:
+            return token
+    return None
@@ -0,0 +1,119 @@
+from expr import *
+
+
+# Binds every local variable reference to a (depth, slot) pair.
+# Names not found in any enclosing block stay unresolved (depth is None)
+# and are looked up in the global environment by name.
+class Resolver:
+    def __init__(self):
+        self.scopes = []
+
+    def resolve(self, stmts: list[Stmt]) -> list[Stmt]:
+        for stmt in stmts:
+            self.visit(stmt)
+        return stmts
+
+    def visit(self, node):
+        # Parser recovers from errors by yielding None nodes
+        if node is None:
+            return None
+        attr = node.__class__.__name__.lower()
+        return getattr(self, attr)(node)
+
+    def declare(self, name: str):
+        if not self.scopes:
+            return None
+        scope = self.scopes[-1]
+        slot = scope.get(name)
+        if slot is None:
+            slot = len(scope)
+            scope[name] = slot
+        return slot
+
+    def lookup(self, name: str):
+        depth = 0
+        for scope in reversed(self.scopes):
+            slot = scope.get(name)
+            if slot is not None:
+                return depth, slot
+            depth += 1
+        return None, None
+
+    def block(self, stmt: Block):
+        # Blocks without declarations don't need an environment of their own
+        if not stmt.has_declarations():
+            stmt.size = 0
+            for s in stmt.statements:
+                self.visit(s)
+            return None
+
+        self.scopes.append({})
+        try:
+            for s in stmt.statements:
+                self.visit(s)
+        finally:
+            stmt.size = len(self.scopes.pop())
+
+    # Parameters and the body's own declarations share one frame
+    def functionstmt(self, stmt: FunctionStmt):
+        stmt.slot = self.declare(stmt.name.lexeme)
+        self.scopes.append({})
+        try:
+            for param in stmt.params:
+                self.declare(param.lexeme)
+            for s in stmt.body:
+                self.visit(s)
+        finally:
+            stmt.size = len(self.scopes.pop())
+
+    def returnstmt(self, stmt: ReturnStmt):
+        self.visit(stmt.value)
+
+    def varstmt(self, stmt: VarStmt):
+        # Initializer is resolved first so `var a = a;` reads the outer `a`
+        self.visit(stmt.initalizer)
+        stmt.slot = self.declare(stmt.name.lexeme)
+
+    def variable(self, expr: Variable):
+        expr.depth, expr.slot = self.lookup(expr.name.lexeme)
+
+    def assign(self, expr: Assign):
+        self.visit(expr.val)
+        expr.depth, expr.slot = self.lookup(expr.name.lexeme)
+
+    def expressionstmt(self, stmt: ExpressionStmt):
+        self.visit(stmt.expression)
+
+    def printstmt(self, stmt: PrintStmt):
+        self.visit(stmt.expression)
+
+    def ifstmt(self, stmt: IfStmt):
+        self.visit(stmt.cond)
+        self.visit(stmt.then_branch)
+        self.visit(stmt.else_branch)
+
+    def whilestmt(self, stmt: WhileStmt):
+        self.visit(stmt.cond)
+        self.visit(stmt.body)
+
+    def binary(self, expr: Binary):
+        self.visit(expr.left)
+        self.visit(expr.right)
+
+    def logical(self, expr: Logical):
+        self.visit(expr.left)
+        self.visit(expr.right)
+
+    def unary(self, expr: Unary):
+        self.visit(expr.right)
+
+    def grouping(self, expr: Grouping):
+        self.visit(expr.expression)
+
+    def call(self, expr: Call):
+        self.visit(expr.calle)
+        for arg in expr.arguments:
+            self.visit(arg)
+
+    def literal(self, expr: Literal):
+        return None
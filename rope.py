@@ -0,0 +1,60 @@
+# Lox strings are Python str, except that concatenations producing long
+# strings return a Rope. A Rope keeps its pieces in a list and only joins
+# them when the text is needed (print, or comparing against a string of
+# the same length), so `s = s + x` in a loop is linear instead of
+# quadratic. Below ROPE_MIN characters copying is cheaper than a Rope.
+ROPE_MIN = 32 * 1024
+
+
+class Rope:
+    __slots__ = ('parts', 'count', 'length', 'flat')
+
+    # The first `count` entries of parts are this rope. Appending shares
+    # the list with the rope appended to, so repeated appends don't copy;
+    # a second append to the same rope has to copy its prefix instead.
+    def __init__(self, parts, count, length):
+        self.parts = parts
+        self.count = count
+        self.length = length
+        self.flat = None
+
+    def append(self, s: str) -> 'Rope':
+        parts = self.parts
+        if len(parts) != self.count:
+            parts = parts[:self.count]
+        parts.append(s)
+        return Rope(parts, self.count + 1, self.length + len(s))
+
+    def __str__(self):
+        if self.flat is None:
+            self.flat = ''.join(self.parts[:self.count])
+            # Later appends start from the joined text instead of the pieces
+            self.parts = [self.flat]
+            self.count = 1
+        return self.flat
+
+    def __len__(self):
+        return self.length
+
+    def __eq__(self, other):
+        if type(other) is not str and type(other) is not Rope:
+            return NotImplemented
+        if self.length != len(other):
+            return False
+        return str(self) == str(other)
+
+    def __hash__(self):
+        return hash(str(self))
+
+    def __repr__(self):
+        return repr(str(self))
+
+
+def concat(left, right):
+    if type(right) is Rope:
+        right = str(right)
+    if type(left) is Rope:
+        return left.append(right)
+    if len(left) + len(right) < ROPE_MIN:
+        return left + right
+    return Rope([left, right], 2, len(left) + len(right))
@@ -1,4 +1,7 @@
 # from dataclasses import dataclass
+import re
+from array import array
+from sys import intern
 from enum import Enum, auto
 
 
@@ -53,6 +56,8 @@ class TokenType(Enum):
 
 
 class Token:
+    __slots__ = ('ttype', 'lexeme', 'literal', 'line')
+
     def __init__(self, ttype, lexeme, literal, line):
         self.ttype = ttype
         self.lexeme = lexeme
@@ -61,6 +66,87 @@ class Token:
     def __repr__(self):
         return f"<{self.ttype}:{self.line}: {self.lexeme}>"
 
+    def __reduce__(self):
+        return (Token, (self.ttype, self.lexeme, self.literal, self.line))
+
+
+# TokenType values are consecutive from 1
+TOKEN_TYPES = [None] + list(TokenType)
+_IDENTIFIER_CODE = TokenType.IDENTIFIER.value
+_NUMBER_CODE = TokenType.NUMBER.value
+_STRING_CODE = TokenType.STRING.value
+
+
+# Tokens stored column-wise: one array each for the TokenType value, the
+# start offset and length of the lexeme in source, and the line. That's
+# 13 bytes a token instead of a Token object and a lexeme string each.
+# Lexemes and literals are sliced from source when asked for, and
+# iterating materializes Token objects one at a time, so a Parser can
+# read a buffer directly without the whole token list ever existing.
+class TokenBuffer:
+    __slots__ = ('source', 'types', 'starts', 'lengths', 'lines')
+
+    def __init__(self, source: str):
+        self.source = source
+        self.types = array('B')
+        self.starts = array('I')
+        self.lengths = array('I')
+        self.lines = array('I')
+
+    def __len__(self):
+        return len(self.types)
+
+    def append(self, ttype: TokenType, start: int, length: int, line: int):
+        self.types.append(ttype.value)
+        self.starts.append(start)
+        self.lengths.append(length)
+        self.lines.append(line)
+
+    def ttype(self, i: int) -> TokenType:
+        return TOKEN_TYPES[self.types[i]]
+
+    def lexeme(self, i: int) -> str:
+        start = self.starts[i]
+        return self.source[start:start + self.lengths[i]]
+
+    def literal(self, i: int):
+        code = self.types[i]
+        if code == _NUMBER_CODE:
+            return float(self.lexeme(i))
+        if code == _STRING_CODE:
+            start = self.starts[i]
+            return self.source[start + 1:start + self.lengths[i] - 1]
+        return None
+
+    def token(self, i: int) -> Token:
+        code = self.types[i]
+        text = FIXED_LEXEMES[code]
+        if text is not None:
+            return Token(TOKEN_TYPES[code], text, None, self.lines[i])
+        text = self.lexeme(i)
+        if code == _IDENTIFIER_CODE:
+            text = intern(text)
+        return Token(TOKEN_TYPES[code], text, self.literal(i), self.lines[i])
+
+    def __iter__(self):
+        source = self.source
+        types = TOKEN_TYPES
+        fixed = FIXED_LEXEMES
+        columns = zip(self.types, self.starts, self.lengths, self.lines)
+        for code, start, length, line in columns:
+            # Keywords and operators always have the same lexeme
+            text = fixed[code]
+            if text is not None:
+                yield Token(types[code], text, None, line)
+                continue
+            text = source[start:start + length]
+            if code == _IDENTIFIER_CODE:
+                yield Token(TokenType.IDENTIFIER, intern(text), None, line)
+            elif code == _NUMBER_CODE:
+                yield Token(TokenType.NUMBER, text, float(text), line)
+            else:
+                yield Token(TokenType.STRING, text, text[1:-1], line)
+
 
 keywords = {
     "and":   TokenType.AND,
@@ -85,18 +171,24 @@ keywords = {
 class Scanner:
     def __init__(self, source):
         self.source = source
-        self.tokens = []
+        self.tokens = TokenBuffer(source)
         self.start = 0
         self.current = 0
         self.line = 1
 
-    def scan_tokens(self):
+    def scan_buffer(self) -> TokenBuffer:
         while not self.is_at_end():
             self.start = self.current
             self.scan_token()
-        self.tokens.append(Token(TokenType.EOF, "", None, self.line))
+        self.tokens.append(TokenType.EOF, self.current, 0, self.line)
         return self.tokens
 
+    def scan_tokens(self):
+        return list(self.scan_buffer())
+
+    def iter_tokens(self):
+        return iter(self.scan_buffer())
+
     def scan_token(self):
         c = self.advance()
         if c == '(':
@@ -172,8 +264,7 @@ class Scanner:
             while self.peek().isdigit():
                 self.advance()
 
-        self.add_token(TokenType.NUMBER, float(
-            self.source[self.start: self.current]))
+        self.add_token(TokenType.NUMBER)
 
     def string(self):
         while (self.peek() != '"') and (not self.is_at_end()):
@@ -186,8 +277,7 @@ class Scanner:
             return None
 
         self.advance()  # The closing '"'
-        value = self.source[self.start + 1: self.current - 1]
-        self.add_token(TokenType.STRING, value)
+        self.add_token(TokenType.STRING)
 
     def block_comment(self):
         while not self.is_at_end():
@@ -225,6 +315,327 @@ class Scanner:
         self.current += 1
         return self.source[self.current - 1]
 
+    # The literal is worked out again from the lexeme when the token is
+    # read back from the buffer
     def add_token(self, ttype: TokenType, literal=None):
-        text = self.source[self.start: self.current]
-        self.tokens.append(Token(ttype, text, literal, self.line))
+        self.tokens.append(ttype, self.start, self.current - self.start, self.line)
+
+
+operators = {
+    "(": TokenType.LEFT_PAREN,
+    ")": TokenType.RIGHT_PAREN,
+    "{": TokenType.LEFT_BRACE,
+    "}": TokenType.RIGHT_BRACE,
+    ",": TokenType.COMMA,
+    ".": TokenType.DOT,
+    "-": TokenType.MINUS,
+    "+": TokenType.PLUS,
+    ";": TokenType.SEMICOLON,
+    "/": TokenType.SLASH,
+    "*": TokenType.STAR,
+    "!": TokenType.BANG,
+    "!=": TokenType.BANG_EQUAL,
+    "=": TokenType.EQUAL,
+    "==": TokenType.EQUAL_EQUAL,
+    ">": TokenType.GREATER,
+    ">=": TokenType.GREATER_EQUAL,
+    "<": TokenType.LESS,
+    "<=": TokenType.LESS_EQUAL,
+}
+
+keyword_codes = {text: ttype.value for text, ttype in keywords.items()}
+operator_codes = {text: ttype.value for text, ttype in operators.items()}
+
+# Indexed by TokenType value: the lexeme every token of that type has, or
+# None where it depends on the source
+FIXED_LEXEMES = [None] * len(TOKEN_TYPES)
+for _text, _ttype in [*keywords.items(), *operators.items(), ("", TokenType.EOF)]:
+    FIXED_LEXEMES[_ttype.value] = _text
+
+# Group numbers of the master regex, tested through match.lastindex.
+# Alternatives are ordered by how common they are in typical sources.
+_NEWLINE, _IDENT, _OP, _NUMBER, _STRING, _LINE_COMMENT, _BLOCK_COMMENT, \
+    _UNTERMINATED, _UNEXPECTED = range(1, 10)
+
+# Every token absorbs the blanks before it; a newline absorbs the blank
+# lines after it. The final catch-all group keeps finditer from silently
+# skipping characters.
+TOKEN_RE = re.compile(r"""[ \t\r]*(?:
+    (\n[ \t\r\n]*)
+  | ([^\W\d_][^\W_]*)
+  | (!=|==|<=|>=|[(){},.\-+;*!=<>]|/(?![/*]))
+  | (\d+(?:\.\d+)?)
+  | ("[^"]*")
+  | (//[^\n]*)
+  | (/\*)
+  | (")
+  | ([^ \t\r])
+)""", re.VERBOSE | re.DOTALL)
+
+BLOCK_COMMENT_RE = re.compile(r"/\*|\*/|\n")
+
+
+# Produces the same tokens as Scanner, but matches whole lexemes with one
+# compiled regex and yields them lazily instead of building a list.
+class RegexScanner:
+    # line is the line number of the start of source, for scanning part of
+    # a larger file
+    def __init__(self, source, line=1):
+        self.source = source
+        self.line = line
+
+    def scan_tokens(self):
+        return list(self.iter_tokens())
+
+    def iter_tokens(self):
+        source = self.source
+        finditer = TOKEN_RE.finditer
+        pos = 0
+        line = self.line
+
+        # finditer is restarted after constructs it can't match itself
+        while pos < len(source):
+            for m in finditer(source, pos):
+                kind = m.lastindex
+                if kind == _NEWLINE:
+                    line += m.group(kind).count('\n')
+                elif kind == _IDENT:
+                    # Names repeat a lot and tokens for them end up in the AST
+                    text = intern(m.group(kind))
+                    yield Token(keywords.get(text, TokenType.IDENTIFIER),
+                                text, None, line)
+                elif kind == _OP:
+                    text = m.group(kind)
+                    yield Token(operators[text], text, None, line)
+                elif kind == _NUMBER:
+                    text = m.group(kind)
+                    yield Token(TokenType.NUMBER, text, float(text), line)
+                elif kind == _STRING:
+                    text = m.group(kind)
+                    line += text.count('\n')
+                    yield Token(TokenType.STRING, text, text[1:-1], line)
+                elif kind == _LINE_COMMENT:
+                    continue
+                elif kind == _BLOCK_COMMENT:
+                    pos, line = self.block_comment(m.end(), line)
+                    break
+                elif kind == _UNTERMINATED:
+                    line += source.count('\n', m.end())
+                    self.report(f"{line}: Unterminated string.", line)
+                    pos = len(source)
+                    break
+                else:
+                    self.report("Unexpected Character", line)
+            else:
+                break
+
+        self.line = line
+        yield Token(TokenType.EOF, "", None, line)
+
+    # Same tokens as iter_tokens, scanned all at once into a TokenBuffer
+    # without creating a Token or lexeme string for any of them
+    def scan_buffer(self) -> TokenBuffer:
+        source = self.source
+        tokens = TokenBuffer(source)
+        types, starts, lengths, lines = \
+            tokens.types.append, tokens.starts.append, tokens.lengths.append, \
+            tokens.lines.append
+        finditer = TOKEN_RE.finditer
+        pos = 0
+        line = self.line
+
+        while pos < len(source):
+            for m in finditer(source, pos):
+                kind = m.lastindex
+                if kind == _NEWLINE:
+                    line += source.count('\n', m.start(kind), m.end())
+                    continue
+                elif kind == _IDENT:
+                    code = keyword_codes.get(m.group(kind), _IDENTIFIER_CODE)
+                elif kind == _OP:
+                    code = operator_codes[m.group(kind)]
+                elif kind == _NUMBER:
+                    code = _NUMBER_CODE
+                elif kind == _STRING:
+                    code = _STRING_CODE
+                    line += source.count('\n', m.start(kind), m.end())
+                elif kind == _LINE_COMMENT:
+                    continue
+                elif kind == _BLOCK_COMMENT:
+                    pos, line = self.block_comment(m.end(), line)
+                    break
+                elif kind == _UNTERMINATED:
+                    line += source.count('\n', m.end())
+                    self.report(f"{line}: Unterminated string.", line)
+                    pos = len(source)
+                    break
+                else:
+                    self.report("Unexpected Character", line)
+                    continue
+                start = m.start(kind)
+                types(code)
+                starts(start)
+                lengths(m.end() - start)
+                lines(line)
+            else:
+                break
+
+        self.line = line
+        tokens.append(TokenType.EOF, len(source), 0, line)
+        return tokens
+
+    def report(self, message, line):
+        print(message)
+
+    def block_comment(self, pos, line):
+        depth = 1
+        for m in BLOCK_COMMENT_RE.finditer(self.source, pos):
+            text = m.group()
+            if text == '\n':
+                line += 1
+            elif text == '/*':
+                depth += 1
+            else:
+                depth -= 1
+                if depth == 0:
+                    return m.end(), line
+        return len(self.source), line
+
+
+# Bytes versions of the patterns above, for MappedScanner. Names may hold
+# any byte outside ASCII here; those are decoded and scanned again as text.
+# In bytes, \w and \d only match ASCII. So a name or number with other
+# bytes in it or right after it (2.5 followed by a non-ASCII digit, say) is
+# matched up to the next byte that can't continue any name or number, and
+# decoded and scanned again as text. The ASCII forms are atomic so they
+# can't back off to a shorter match instead.
+_MAPPED_RUN = r"[\w.\x80-\xff]*"
+MAPPED_TOKEN_RE = re.compile(TOKEN_RE.pattern.replace(
+    r"([^\W\d_][^\W_]*)",
+    r"((?>[^\W\d_][^\W_]*)(?![\x80-\xff])|(?:[^\W\d_]|[\x80-\xff])"
+    + _MAPPED_RUN + ")").replace(
+    r"(\d+(?:\.\d+)?)",
+    r"((?>\d+(?:\.\d+)?)(?![\x80-\xff]|\.[\x80-\xff])|\d" + _MAPPED_RUN + ")"
+).encode(), re.VERBOSE | re.DOTALL)
+MAPPED_BLOCK_COMMENT_RE = re.compile(rb"/\*|\*/|\n")
+# Keywords and operators by their bytes, with the lexeme to give them
+MAPPED_LEXEMES = {text.encode(): (ttype, text)
+                  for text, ttype in [*keywords.items(), *operators.items()]}
+
+# How much scanned source MappedScanner lets pile up before handing the
+# pages back
+RELEASE_BYTES = 1024 * 1024
+
+
+# Produces the same tokens as RegexScanner from UTF-8 bytes, normally an
+# mmap of the script, without decoding the source as a whole: only each
+# lexeme is decoded. Pages of an mmap that have been scanned are given
+# back to the OS as it goes, so memory use doesn't grow with the file.
+class MappedScanner:
+    def __init__(self, source, line=1):
+        self.source = source
+        self.line = line
+        self.dontneed = None
+        if hasattr(source, 'madvise'):
+            import mmap
+            self.dontneed = getattr(mmap, 'MADV_DONTNEED', None)
+            self.pagesize = mmap.PAGESIZE
+
+    def scan_tokens(self):
+        return list(self.iter_tokens())
+
+    def iter_tokens(self):
+        source = self.source
+        finditer = MAPPED_TOKEN_RE.finditer
+        mapped_lexemes = MAPPED_LEXEMES
+        pos = 0
+        line = self.line
+        released = 0
+
+        while pos < len(source):
+            for m in finditer(source, pos):
+                kind = m.lastindex
+                if kind == _NEWLINE:
+                    line += m.group(kind).count(b'\n')
+                    if m.end() - released >= RELEASE_BYTES:
+                        released = self.release(released, m.end())
+                elif kind == _IDENT:
+                    text = m.group(kind)
+                    fixed = mapped_lexemes.get(text)
+                    if fixed is not None:
+                        yield Token(fixed[0], fixed[1], None, line)
+                    elif text.isascii():
+                        yield Token(TokenType.IDENTIFIER,
+                                    intern(text.decode('ascii')), None, line)
+                    else:
+                        yield from self.scan_text(text.decode('utf-8'), line)
+                elif kind == _OP:
+                    ttype, text = mapped_lexemes[m.group(kind)]
+                    yield Token(ttype, text, None, line)
+                elif kind == _NUMBER:
+                    text = m.group(kind)
+                    if text.isascii():
+                        text = text.decode('ascii')
+                        yield Token(TokenType.NUMBER, text, float(text), line)
+                    else:
+                        yield from self.scan_text(text.decode('utf-8'), line)
+                elif kind == _STRING:
+                    text = m.group(kind).decode('utf-8')
+                    line += text.count('\n')
+                    yield Token(TokenType.STRING, text, text[1:-1], line)
+                elif kind == _LINE_COMMENT:
+                    continue
+                elif kind == _BLOCK_COMMENT:
+                    pos, line = self.block_comment(m.end(), line)
+                    break
+                elif kind == _UNTERMINATED:
+                    newline = source.find(b'\n', m.end())
+                    while newline != -1:
+                        line += 1
+                        newline = source.find(b'\n', newline + 1)
+                    self.report(f"{line}: Unterminated string.", line)
+                    pos = len(source)
+                    break
+                else:
+                    self.report("Unexpected Character", line)
+            else:
+                break
+
+        self.line = line
+        yield Token(TokenType.EOF, "", None, line)
+
+    # Names and numbers with bytes outside ASCII go through the text
+    # scanner, which knows which of those characters are letters and digits
+    def scan_text(self, text, line):
+        scanner = RegexScanner(text, line)
+        scanner.report = self.report
+        for token in scanner.iter_tokens():
+            if token.ttype is not TokenType.EOF:
+                yield token
+
+    # Drops the whole pages of source[start:end] from memory; they are
+    # read back from the file if anything touches them again
+    def release(self, start, end):
+        if self.dontneed is None:
+            return end
+        end -= end % self.pagesize
+        if end > start:
+            self.source.madvise(self.dontneed, start, end - start)
+        return end
+
+    def report(self, message, line):
+        print(message)
+
+    def block_comment(self, pos, line):
+        depth = 1
+        for m in MAPPED_BLOCK_COMMENT_RE.finditer(self.source, pos):
+            text = m.group()
+            if text == b'\n':
+                line += 1
+            elif text == b'/*':
+                depth += 1
+            else:
+                depth -= 1
+                if depth == 0:
+                    return m.end(), line
+        return len(self.source), line
@@ -0,0 +1,125 @@
+import asyncio
+import io
+import sys
+import time
+import traceback
+from collections import deque
+from main import Lox, drain
+
+# Runs many Lox programs in one process as green threads. Each program
+# has its own Lox instance, and so its own globals, and runs on the VM in
+# slices of `quantum` loop iterations and calls (see VM.slices). The
+# scheduler switches between ready programs round-robin after each slice.
+# Only the VM can be suspended: the tree-walker keeps its state on the
+# Python stack.
+
+QUANTUM = 1000
+
+
+class GreenThread:
+    def __init__(self, lox, source: str, name, quantum: int):
+        self.lox = lox
+        self.name = name
+        self.out = io.StringIO()
+        self.seconds = 0.0
+        # The run_captured() result once the program has finished
+        self.result = None
+        # Set by Scheduler.submit() for callers awaiting the result
+        self.future = None
+        self.units = lox.compile(source)
+        self.slices = lox.interpreter.slices(self.units, quantum)
+
+    # Runs the program until it suspends; False once it has finished
+    def step(self) -> bool:
+        stdout = sys.stdout
+        sys.stdout = self.out
+        start = time.perf_counter()
+        try:
+            next(self.slices)
+            return True
+        except StopIteration:
+            status, error = 'ok', None
+            # Reports syntax errors past a runtime error
+            drain(self.units)
+            self.units.close()
+        except Exception:
+            status, error = 'crash', traceback.format_exc()
+        finally:
+            self.seconds += time.perf_counter() - start
+            sys.stdout = stdout
+        self.finish(status, error)
+        return False
+
+    def finish(self, status, error):
+        if status == 'ok':
+            error = self.lox.interpreter.runtime_error
+            if error is None and self.lox.had_error:
+                error = "Syntax error"
+            if error is not None:
+                status = 'error'
+        # Same shape as batch.run_captured(); seconds is the time spent
+        # running this program, not the time it waited for others
+        self.result = {
+            'script': self.name,
+            'status': status,
+            'seconds': self.seconds,
+            'stdout': self.out.getvalue(),
+            'error': error,
+        }
+        if self.future is not None and not self.future.done():
+            self.future.set_result(self.result)
+
+
+class Scheduler:
+    def __init__(self, options: dict = None, quantum: int = QUANTUM):
+        self.options = dict(options or {}, engine='vm')
+        self.quantum = quantum
+        self.ready = deque()
+        self.wakeup = None
+
+    def spawn(self, source: str, name=None) -> GreenThread:
+        thread = GreenThread(Lox(False, **self.options), source, name,
+                             self.quantum)
+        self.ready.append(thread)
+        if self.wakeup is not None:
+            self.wakeup.set()
+        return thread
+
+    # Runs one slice of the next ready program; False if none is left
+    def step(self) -> bool:
+        if not self.ready:
+            return False
+        thread = self.ready.popleft()
+        if thread.step():
+            self.ready.append(thread)
+        return True
+
+    # Runs every spawned program to the end, without an event loop
+    def run(self) -> list:
+        threads = list(self.ready)
+        while self.step():
+            pass
+        return [thread.result for thread in threads]
+
+    # Spawns a program and waits for its result while serve() runs
+    async def submit(self, source: str, name=None) -> dict:
+        thread = self.spawn(source, name)
+        thread.future = asyncio.get_running_loop().create_future()
+        return await thread.future
+
+    # Drives the scheduler from an asyncio task. Programs run for at most
+    # `interval` seconds at a time before the event loop gets control back,
+    # and the task sleeps while no program is ready.
+    async def serve(self, interval: float = 0.005):
+        self.wakeup = asyncio.Event()
+        try:
+            while True:
+                if not self.ready:
+                    self.wakeup.clear()
+                    await self.wakeup.wait()
+                deadline = time.perf_counter() + interval
+                while self.step() and time.perf_counter() < deadline:
+                    pass
+                await asyncio.sleep(0)
+        finally:
+            self.wakeup = None
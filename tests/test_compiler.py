@@ -0,0 +1,29 @@
+import contextlib
+import io
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import Lox
+
+
+def run(source, engine, opt_level):
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        Lox(False, engine=engine, opt_level=opt_level).run_source(source)
+    return out.getvalue()
+
+
+# 0.0 and -0.0 compare equal but must stay separate constants
+@pytest.mark.parametrize('opt_level', [0, 1])
+@pytest.mark.parametrize('source, expected', [
+    ('{ var x = 1; print -0; print 0; }', '-0.0\n0.0\n'),
+    ('{ var x = 1; print 0; print -0; }', '0.0\n-0.0\n'),
+    ('for (var j = 0; j < 2; j = j + 1) print -0;', '-0.0\n-0.0\n'),
+])
+def test_signed_zero_constants(source, expected, opt_level):
+    assert run(source, 'tree', opt_level) == expected
+    assert run(source, 'vm', opt_level) == expected
@@ -0,0 +1,37 @@
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from incremental import Document
+
+
+# Errors, statements and tokens, which after any edit should be what a
+# fresh parse of the new source gives
+def state(doc):
+    return (doc.errors(), repr(doc.statements()),
+            [(t.ttype, t.lexeme, t.line) for t in doc.tokens()],
+            doc.is_complete())
+
+
+def test_edit_keeps_scan_errors():
+    doc = Document('print a;\n;"')
+    doc.edit(6, 8, 'x\n')
+    assert doc.errors() == [(3, 'Unterminated string.')]
+    assert state(doc) == state(Document(doc.source))
+
+
+def test_random_edits():
+    pieces = ['print a;', 'var b = 1;', '\n', '\n\n', ';', '"', '"s\n"', '{', '}',
+              'if (a) ', 'else ', 'fun f() {', 'return;', '/*', '*/', '//',
+              '@', 'x', '1 +', ' ']
+    rng = random.Random(20)
+    for _ in range(300):
+        doc = Document(''.join(rng.choice(pieces) for _ in range(rng.randint(0, 12))))
+        for _ in range(10):
+            start = rng.randint(0, len(doc.source))
+            end = rng.randint(start, min(start + 6, len(doc.source)))
+            text = ''.join(rng.choice(pieces) for _ in range(rng.randint(0, 3)))
+            doc.edit(start, end, text)
+            assert state(doc) == state(Document(doc.source)), doc.source
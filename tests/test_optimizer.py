@@ -0,0 +1,41 @@
+import contextlib
+import io
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import Lox
+
+
+def run(source, engine, opt_level):
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        Lox(False, engine=engine, opt_level=opt_level).run_source(source)
+    return out.getvalue()
+
+
+# Expressions in branches that never run must not be hoisted out of the
+# loop, where they would always run and raise
+@pytest.mark.parametrize('engine', ['tree', 'vm'])
+@pytest.mark.parametrize('source', [
+    'var d = 0; var x = 0; while (x < 3) { if (d != 0) print 10 / d; x = x + 1; } print "done";',
+    'var s = "a"; var x = 0; while (x < 3) { if (x > 5) print s - 1; x = x + 1; } print "done";',
+    'var s = "a"; var x = 0; while (x < 3) { x = x + 1; var t = x > 5 and s - 1; } print "done";',
+])
+def test_hoist_keeps_branches(source, engine):
+    assert run(source, engine, 2) == run(source, engine, 0) == "done\n"
+
+
+# Nor hoisted above an earlier statement whose effect would then be lost
+@pytest.mark.parametrize('engine', ['tree', 'vm'])
+@pytest.mark.parametrize('source', [
+    'var s = "a"; var x = 0; while (x < 3) { print "iter"; print s - 1; x = x + 1; }',
+    'var s = "a"; var x = 0; while (x < 3) { x = x + 1; print s - 1; }',
+])
+def test_hoist_keeps_effect_order(source, engine):
+    expected = run(source, engine, 0)
+    assert run(source, engine, 2) == expected
+    assert "Operands must be numbers" in expected
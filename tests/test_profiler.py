@@ -0,0 +1,33 @@
+import contextlib
+import io
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import Lox
+
+DEEP = """
+fun leaf(n) { return n + 1; }
+fun deep(n) { if (n < 1) return 0; return leaf(n) + deep(n - 1); }
+print deep(%d);
+"""
+
+
+def collapsed(source, path):
+    lox = Lox(False, profile=True)
+    with contextlib.redirect_stdout(io.StringIO()):
+        lox.run_source(source)
+    lox.interpreter.write_collapsed(path)
+    with open(path) as f:
+        return f.read().splitlines()
+
+
+# Recursion folds into one frame, so the output doesn't grow with depth
+def test_collapsed_size_bounded_by_recursion_depth(tmp_path):
+    shallow = collapsed(DEEP % 10, tmp_path / 'shallow.txt')
+    deep = collapsed(DEEP % 5000, tmp_path / 'deep.txt')
+    stacks = sorted(line.rsplit(' ', 1)[0] for line in deep)
+    assert stacks == ['<script>', '<script>;deep:3', '<script>;deep:3;leaf:2']
+    assert sorted(line.rsplit(' ', 1)[0] for line in shallow) == stacks
+    assert os.path.getsize(tmp_path / 'deep.txt') < 200
@@ -0,0 +1,45 @@
+import contextlib
+import io
+import os
+import random
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scanner import RegexScanner, MappedScanner
+
+
+# Tokens and error output, as (type, lexeme, literal, line) tuples
+def scan(scanner):
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        tokens = [(t.ttype, t.lexeme, t.literal, t.line) for t in scanner.iter_tokens()]
+    return tokens, out.getvalue()
+
+
+def assert_same(text):
+    assert scan(MappedScanner(text.encode('utf-8'))) == scan(RegexScanner(text))
+
+
+@pytest.mark.parametrize('text', [
+    'print 2.5٣;',
+    'var x = 2٣ + ٣4;',
+    '2.٣ 2.5.٣ 7é 7éa 1_٣ 3.x',
+    'var café = 1; print café + naïve;',
+    'var x١ = "ünï\ncode"; // ç\n/* é\n */ print x١;',
+    'print 1 € 2;',
+    'print "unterminated ü\n\n',
+])
+def test_mapped_scanner_non_ascii(text):
+    assert_same(text)
+
+
+# Random runs of the characters where ASCII and non-ASCII handling meet
+def test_mapped_scanner_fuzz():
+    pieces = ['1', '25', '.', '٣', '۷', 'é', 'a', '_', ' ', '\n', '€', '+',
+              '"', '/', '*', '//', 'var', 'ß', '²', ' ']
+    rng = random.Random(1234)
+    for _ in range(2000):
+        assert_same(''.join(rng.choice(pieces) for _ in range(rng.randint(1, 12))))
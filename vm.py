@@ -0,0 +1,380 @@
+import sys
+from collections.abc import Iterable
+from compiler import *
+from rope import Rope, concat
+import natives
+from natives import NativeFunction, NativeError
+from interpreter import LoxRuntimeError, LoxCallabe, GlobalEnvironment, \
+    DEEP_RECURSION, RECURSION_LIMIT
+
+
+# Deepest Lox call stack the VM runs before reporting a stack overflow,
+# about as deep as the tree-walker gets under RECURSION_LIMIT
+MAX_FRAMES = 200_000
+
+
+class Closure(LoxCallabe):
+    def __init__(self, function: Function, upvalues):
+        self.function = function
+        self.upvalues = upvalues
+
+    def arity(self):
+        return self.function.arity
+
+    def __repr__(self):
+        return repr(self.function)
+
+
+# A variable captured by a closure. While open it points into the slot list
+# of the frame that declared it; closing moves the value into a cell of its
+# own so the slot can be reused.
+class Upvalue:
+    def __init__(self, cells, index):
+        self.cells = cells
+        self.index = index
+
+    def close(self):
+        self.cells = [self.cells[self.index]]
+        self.index = 0
+
+
+class VM:
+    def __init__(self):
+        self.globals = GlobalEnvironment()
+        natives.bind(self.globals, self)
+        # Message of the error that stopped the last interpret() call
+        self.runtime_error = None
+
+    # Lox calls don't recurse in the VM, but parsing and compiling deeply
+    # nested expressions do, as in the tree-walker
+    def interpret(self, chunks: Iterable[Chunk]):
+        limit = sys.getrecursionlimit()
+        if DEEP_RECURSION:
+            sys.setrecursionlimit(max(limit, RECURSION_LIMIT))
+        try:
+            for _ in self.slices(chunks, 0):
+                pass
+        finally:
+            sys.setrecursionlimit(limit)
+
+    # Calls a Lox value from Python, for builtins that take a function
+    def call_value(self, callee, arguments: list):
+        chunk = Chunk()
+        chunk.constants = [callee] + arguments
+        for i in range(len(chunk.constants)):
+            chunk.emit(OP_CONSTANT, i)
+        chunk.emit(OP_CALL, len(arguments), OP_RETURN)
+        # Never suspends with a quantum of 0
+        try:
+            next(self.run(chunk))
+        except StopIteration as stop:
+            return stop.value
+
+    # Runs chunks like interpret(), but suspends after every `quantum` loop
+    # iterations and calls so other programs can run in between; see
+    # scheduler.py. A quantum of 0 never suspends.
+    def slices(self, chunks: Iterable[Chunk], quantum: int):
+        self.runtime_error = None
+        try:
+            for chunk in chunks:
+                yield from self.run(chunk, quantum)
+        except LoxRuntimeError as e:
+            self.runtime_error = str(e)
+            print(e)
+        except RecursionError:
+            self.runtime_error = "Stack overflow."
+            print(self.runtime_error)
+
+    # A generator. Backward jumps and calls are the only places a program
+    # can run for long, so they are the only places the budget is counted
+    # down; between them runs straight-line code of bounded length. All of
+    # the program's state is in the locals here, so suspending costs no
+    # more than the yield.
+    def run(self, chunk: Chunk, quantum: int = 0):
+        code = chunk.code
+        constants = chunk.constants
+        caches = chunk.caches
+        slots = [None] * chunk.nslots
+        upvalues = ()
+        open_upvalues = {}
+        globals_ = self.globals
+        gvalues = globals_.values
+        version = globals_.version
+        stack = []
+        push = stack.append
+        pop = stack.pop
+        ip = 0
+        # Callers' saved state; Lox calls never recurse into run()
+        frames = []
+        # Only reaches 0 again when counted down from a positive quantum
+        budget = quantum
+
+        # Opcodes are tested roughly in order of how often they execute
+        while True:
+            op = code[ip]
+            if op == OP_GET_LOCAL:
+                val = slots[code[ip + 1]]
+                if val is None:
+                    raise LoxRuntimeError(
+                        f"Varname {constants[code[ip + 2]]} is never assigned")
+                push(val)
+                ip += 3
+            elif op == OP_CONSTANT:
+                push(constants[code[ip + 1]])
+                ip += 2
+            elif op == OP_GET_GLOBAL:
+                cache = caches[code[ip + 2]]
+                if cache[0] == version:
+                    val = gvalues[cache[1]]
+                else:
+                    val = None
+                    index = globals_.names.get(constants[code[ip + 1]])
+                    if index is not None:
+                        cache[0] = version
+                        cache[1] = index
+                        val = gvalues[index]
+                if val is None:
+                    raise LoxRuntimeError(
+                        f"Varname {constants[code[ip + 1]]} is never assigned")
+                push(val)
+                ip += 3
+            elif op == OP_SET_LOCAL:
+                slots[code[ip + 1]] = stack[-1]
+                ip += 2
+            elif op == OP_SET_GLOBAL:
+                cache = caches[code[ip + 2]]
+                if cache[0] != version:
+                    index = globals_.names.get(constants[code[ip + 1]])
+                    if index is None:
+                        raise LoxRuntimeError(
+                            f'undefined variable {constants[code[ip + 1]]}, '
+                            f'cannot assign {stack[-1]}')
+                    cache[0] = version
+                    cache[1] = index
+                gvalues[cache[1]] = stack[-1]
+                ip += 3
+            elif op == OP_POP:
+                pop()
+                ip += 1
+            elif op == OP_POP_JUMP_IF_FALSE:
+                val = pop()
+                if val is None or val is False:
+                    ip = code[ip + 1]
+                else:
+                    ip += 2
+            elif op == OP_JUMP:
+                target = code[ip + 1]
+                if target < ip:
+                    budget -= 1
+                    if budget == 0:
+                        yield
+                        budget = quantum
+                ip = target
+            elif op == OP_SUBTRACT:
+                b = pop()
+                a = stack[-1]
+                if type(a) is not float or type(b) is not float:
+                    raise LoxRuntimeError("Operands must be numbers")
+                stack[-1] = a - b
+                ip += 1
+            elif op == OP_ADD:
+                b = pop()
+                a = stack[-1]
+                if type(a) is float and type(b) is float:
+                    stack[-1] = a + b
+                elif (type(a) is str or type(a) is Rope) and \
+                        (type(b) is str or type(b) is Rope):
+                    stack[-1] = concat(a, b)
+                else:
+                    raise LoxRuntimeError("Wrong types for addition")
+                ip += 1
+            elif op == OP_LESS:
+                b = pop()
+                a = stack[-1]
+                if type(a) is not float or type(b) is not float:
+                    raise LoxRuntimeError("Operands must be numbers")
+                stack[-1] = a < b
+                ip += 1
+            elif op == OP_GREATER:
+                b = pop()
+                a = stack[-1]
+                if type(a) is not float or type(b) is not float:
+                    raise LoxRuntimeError("Operands must be numbers")
+                stack[-1] = a > b
+                ip += 1
+            elif op == OP_MULTIPLY:
+                b = pop()
+                a = stack[-1]
+                if type(a) is not float or type(b) is not float:
+                    raise LoxRuntimeError("Operands must be numbers")
+                stack[-1] = a * b
+                ip += 1
+            elif op == OP_DEFINE_LOCAL:
+                slots[code[ip + 1]] = pop()
+                ip += 2
+            elif op == OP_LESS_EQUAL:
+                b = pop()
+                a = stack[-1]
+                if type(a) is not float or type(b) is not float:
+                    raise LoxRuntimeError("Operands must be numbers")
+                stack[-1] = a <= b
+                ip += 1
+            elif op == OP_GREATER_EQUAL:
+                b = pop()
+                a = stack[-1]
+                if type(a) is not float or type(b) is not float:
+                    raise LoxRuntimeError("Operands must be numbers")
+                stack[-1] = a >= b
+                ip += 1
+            elif op == OP_EQUAL:
+                b = pop()
+                stack[-1] = stack[-1] == b
+                ip += 1
+            elif op == OP_NOT_EQUAL:
+                b = pop()
+                stack[-1] = not stack[-1] == b
+                ip += 1
+            elif op == OP_DIVIDE:
+                b = pop()
+                a = stack[-1]
+                if type(a) is not float or type(b) is not float:
+                    raise LoxRuntimeError("Operands must be numbers")
+                if b == 0.0:
+                    raise LoxRuntimeError("Cannot divide by zero")
+                stack[-1] = a / b
+                ip += 1
+            elif op == OP_JUMP_IF_FALSE_OR_POP:
+                val = stack[-1]
+                if val is None or val is False:
+                    ip = code[ip + 1]
+                else:
+                    pop()
+                    ip += 2
+            elif op == OP_JUMP_IF_TRUE_OR_POP:
+                val = stack[-1]
+                if val is None or val is False:
+                    pop()
+                    ip += 2
+                else:
+                    ip = code[ip + 1]
+            elif op == OP_NOT:
+                val = stack[-1]
+                stack[-1] = val is None or val is False
+                ip += 1
+            elif op == OP_NEGATE:
+                if type(stack[-1]) is not float:
+                    raise LoxRuntimeError("Operands must be numbers")
+                stack[-1] = -stack[-1]
+                ip += 1
+            elif op == OP_TRUE:
+                push(True)
+                ip += 1
+            elif op == OP_FALSE:
+                push(False)
+                ip += 1
+            elif op == OP_NIL:
+                push(None)
+                ip += 1
+            elif op == OP_PRINT:
+                print(pop())
+                ip += 1
+            elif op == OP_CALL or op == OP_TAIL_CALL:
+                argc = code[ip + 1]
+                arguments = stack[len(stack) - argc:]
+                del stack[len(stack) - argc:]
+                function = stack[-1]
+                if type(function) is Closure:
+                    proto = function.function
+                    if argc != proto.arity:
+                        raise LoxRuntimeError(
+                            f"Expected {proto.arity} arguments but got {argc}.")
+                    if op == OP_CALL:
+                        if len(frames) >= MAX_FRAMES:
+                            raise LoxRuntimeError("Stack overflow.")
+                        frames.append(
+                            (code, constants, caches, slots, ip + 2, upvalues,
+                             open_upvalues))
+                    else:
+                        # A tail call replaces the current frame; the
+                        # callee's result goes where this frame's would
+                        pop()
+                        for upvalue in open_upvalues.values():
+                            upvalue.close()
+                    # The arguments become the callee's first slots
+                    arguments.extend(proto.padding)
+                    slots = arguments
+                    code = proto.chunk.code
+                    constants = proto.chunk.constants
+                    caches = proto.chunk.caches
+                    upvalues = function.upvalues
+                    open_upvalues = {}
+                    ip = 0
+                    budget -= 1
+                    if budget == 0:
+                        yield
+                        budget = quantum
+                    continue
+                if type(function) is NativeFunction:
+                    if argc != function.arity:
+                        raise LoxRuntimeError(
+                            f"Expected {function.arity} arguments but got {argc}.")
+                    try:
+                        stack[-1] = function.fn(*arguments)
+                    except NativeError as e:
+                        raise LoxRuntimeError(str(e))
+                    ip += 2
+                    continue
+                if not isinstance(function, LoxCallabe):
+                    raise LoxRuntimeError(
+                        "Can only call functions and classes.")
+                if argc != function.arity():
+                    raise LoxRuntimeError(
+                        f"Expected {function.arity()} arguments but got {argc}.")
+                stack[-1] = function.call(*arguments)
+                ip += 2
+            elif op == OP_GET_UPVALUE:
+                upvalue = upvalues[code[ip + 1]]
+                val = upvalue.cells[upvalue.index]
+                if val is None:
+                    raise LoxRuntimeError(
+                        f"Varname {constants[code[ip + 2]]} is never assigned")
+                push(val)
+                ip += 3
+            elif op == OP_SET_UPVALUE:
+                upvalue = upvalues[code[ip + 1]]
+                upvalue.cells[upvalue.index] = stack[-1]
+                ip += 2
+            elif op == OP_DEFINE_GLOBAL:
+                globals_.define(constants[code[ip + 1]], pop())
+                ip += 2
+            elif op == OP_CLOSURE:
+                proto = constants[code[ip + 1]]
+                captured = []
+                ip += 2
+                for _ in range(proto.upvalue_count):
+                    index = code[ip + 1]
+                    if code[ip]:
+                        upvalue = open_upvalues.get(index)
+                        if upvalue is None:
+                            upvalue = open_upvalues[index] = Upvalue(slots, index)
+                        captured.append(upvalue)
+                    else:
+                        captured.append(upvalues[index])
+                    ip += 2
+                push(Closure(proto, captured))
+            elif op == OP_CLOSE_UPVALUE:
+                upvalue = open_upvalues.pop(code[ip + 1], None)
+                if upvalue is not None:
+                    upvalue.close()
+                ip += 2
+            elif op == OP_RETURN:
+                for upvalue in open_upvalues.values():
+                    upvalue.close()
+                if not frames:
+                    return pop()
+                result = pop()
+                stack[-1] = result
+                code, constants, caches, slots, ip, upvalues, open_upvalues = \
+                    frames.pop()
+            else:
+                raise LoxRuntimeError(f"Unknown opcode {op}")